@@ -0,0 +1,140 @@
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing as mp
+import os
+from pathlib import Path
+import platform
+import resource
+import time
+from typing import Any, cast
+
+import hydra
+from loguru import logger
+from omegaconf import DictConfig, OmegaConf
+import torch
+
+from mlops.src.components.generator import CHECKPOINT_MODES, define_G
+
+
+def saved_activation_bytes(generator: torch.nn.Module, x: torch.Tensor) -> int:
+    """
+    Bytes of tensors autograd keeps for the backward pass of one generator forward.
+
+    Tensors saved inside checkpointed stages are managed by the checkpoint and dropped
+    right away, so they are not counted.
+    """
+    storages: dict[int, int] = {}
+
+    def pack(t: torch.Tensor):
+        storage = t.untyped_storage()
+        storages[storage.data_ptr()] = storage.nbytes()
+        return t
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+        out = generator(x)
+    saved = sum(storages.values())
+    del out
+    return saved
+
+
+def run_mode(model_cfg: dict, mode: str, img_size: int, batch_size: int, steps: int, warmup: int):
+    """Measure one checkpointing mode; run in a fresh process so peak RSS is per mode."""
+    torch.manual_seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator = define_G(
+            3,
+            3,
+            model_cfg["ngf"],
+            "global",
+            n_downsample_global=model_cfg["n_downsampling"],
+            n_blocks_global=model_cfg["n_blocks"],
+            checkpointing=mode,
+        )
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    generator.to(device)
+    x = torch.rand(batch_size, 3, img_size, img_size, device=device) * 2 - 1
+    saved = saved_activation_bytes(generator, x)
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+
+    timings = []
+    for i in range(warmup + steps):
+        start = time.perf_counter()
+        generator(x).square().mean().backward()
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        generator.zero_grad(set_to_none=True)
+        if i >= warmup:
+            timings.append(time.perf_counter() - start)
+
+    row = {
+        "mode": mode,
+        "image_size": img_size,
+        "batch_size": batch_size,
+        "step_ms": 1000 * sum(timings) / len(timings),
+        "saved_activation_mb": saved / 2**20,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if device.type == "cuda":
+        row["peak_cuda_mb"] = torch.cuda.max_memory_allocated() / 2**20
+    return row
+
+
+@hydra.main(config_path="../config", config_name="config", version_base=None)
+def main(cfg: DictConfig):
+    bench = cfg.benchmark.checkpointing
+    output_dir = Path(cfg.benchmark.output_dir)
+    model_cfg = {
+        "ngf": cfg.model.generator.ngf,
+        "n_downsampling": cfg.model.generator.n_downsampling,
+        "n_blocks": cfg.model.generator.n_blocks,
+    }
+
+    results: dict = {
+        "benchmark": "checkpointing",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "cuda": torch.cuda.is_available(),
+        },
+        "config": {**cast(dict[str, Any], OmegaConf.to_container(bench)), "generator": model_cfg},
+        "modes": [],
+    }
+
+    ctx = mp.get_context("spawn")
+    for img_size in bench.image_sizes:
+        baseline = None
+        for mode in CHECKPOINT_MODES:
+            with ctx.Pool(1) as pool:
+                row = pool.apply(
+                    run_mode,
+                    (model_cfg, mode, img_size, bench.batch_size, bench.steps, bench.warmup),
+                )
+            baseline = baseline or row
+            row["time_overhead"] = row["step_ms"] / baseline["step_ms"] - 1
+            row["activation_saving"] = 1 - row["saved_activation_mb"] / max(
+                baseline["saved_activation_mb"], 1e-9
+            )
+            results["modes"].append(row)
+            logger.info(
+                f"{mode:<6} size={img_size:<5} {row['step_ms']:9.1f} ms/step "
+                f"({row['time_overhead']:+.0%})  saved activations "
+                f"{row['saved_activation_mb']:8.1f} MB ({-row['activation_saving']:+.0%})  "
+                f"peak RSS {row['peak_rss_mb']:8.1f} MB"
+            )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_path = output_dir / f"checkpointing_{datetime.datetime.now():%Y-%m-%d-%H-%M-%S}.json"
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.success(f"Results written to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing as mp
+import os
+from pathlib import Path
+import platform
+import shutil
+import time
+from typing import Any, cast
+
+import hydra
+from loguru import logger
+from omegaconf import DictConfig, OmegaConf
+import torch
+
+from mlops.src.components.compilation import compile_modules, enable_compile_cache
+from mlops.src.components.discriminator import define_D
+from mlops.src.components.generator import define_G
+from mlops.src.components.losses import GANLoss, VGGLoss
+from mlops.src.components.replay_pool import ReplayPool
+from mlops.src.models.pix2pixhd_module import Pix2PixHD
+
+
+def build_model(model_cfg: dict) -> Pix2PixHD:
+    torch.manual_seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator = define_G(
+            3,
+            3,
+            model_cfg["ngf"],
+            "global",
+            n_downsample_global=model_cfg["n_downsampling"],
+            n_blocks_global=model_cfg["n_blocks"],
+        )
+        discriminator = define_D(
+            6,
+            model_cfg["ndf"],
+            model_cfg["n_layers"],
+            num_D=model_cfg["num_D"],
+            getIntermFeat=True,
+        )
+    return Pix2PixHD(
+        generator=generator,
+        discriminator=discriminator,
+        criterion_gan=GANLoss(use_lsgan=True),
+        criterion_feat=torch.nn.L1Loss(),
+        # Weights do not change the cost, so a random init avoids the download
+        criterion_vgg=VGGLoss(pretrained=False),
+        replay_pool=ReplayPool(0),
+        device=torch.device("cpu"),
+        reuse_fake=True,
+        fuse_discriminator=True,
+    )
+
+
+def run_mode(model_cfg: dict, bench: dict, compiled: bool, cache_dir: str) -> dict:
+    """Time G+D forward/backward steps in a fresh process; compiled modes report compile time."""
+    model = build_model(model_cfg)
+    if compiled:
+        enable_compile_cache(cache_dir)
+        vgg = cast(VGGLoss, model.criterion_vgg).vgg
+        compile_modules(model.generator, model.discriminator, vgg, backend=bench["backend"])
+    size, batch_size = bench["image_size"], bench["batch_size"]
+    data = torch.randint(0, 256, (batch_size, 3, size, size), dtype=torch.uint8)
+    target = torch.randint(0, 256, (batch_size, 3, size, size), dtype=torch.uint8)
+
+    start = time.perf_counter()
+    model.warmup(data, target, steps=bench["warmup"])
+    warmup_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.warmup(data, target, steps=bench["steps"])
+    step_ms = 1000 * (time.perf_counter() - start) / bench["steps"]
+    return {"warmup_s": warmup_s, "step_ms": step_ms}
+
+
+@hydra.main(config_path="../config", config_name="config", version_base=None)
+def main(cfg: DictConfig):
+    bench = cast(dict[str, Any], OmegaConf.to_container(cfg.benchmark.compile))
+    output_dir = Path(cfg.benchmark.output_dir)
+    model_cfg = {
+        "ngf": cfg.model.generator.ngf,
+        "n_downsampling": cfg.model.generator.n_downsampling,
+        "n_blocks": cfg.model.generator.n_blocks,
+        "ndf": cfg.model.discriminator.ndf,
+        "n_layers": cfg.model.discriminator.n_layers,
+        "num_D": cfg.model.discriminator.num_D,
+    }
+    # A fresh cache directory, so the first compiled run is cold and the second warm
+    cache_dir = Path(bench["cache_dir"])
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results: dict = {
+        "benchmark": "compile",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+        },
+        "config": {**bench, "model": model_cfg},
+        "modes": [],
+    }
+
+    ctx = mp.get_context("spawn")
+    eager_ms = None
+    for name, compiled in [("eager", False), ("compiled_cold", True), ("compiled_warm", True)]:
+        with ctx.Pool(1) as pool:
+            row = pool.apply(run_mode, (model_cfg, bench, compiled, str(cache_dir)))
+        eager_ms = eager_ms or row["step_ms"]
+        row.update(mode=name, speedup=eager_ms / row["step_ms"])
+        results["modes"].append(row)
+        logger.info(
+            f"{name:<14} {row['step_ms']:9.1f} ms/step  x{row['speedup']:.2f}  "
+            f"warmup {row['warmup_s']:7.1f}s"
+        )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_path = output_dir / f"compile_{datetime.datetime.now():%Y-%m-%d-%H-%M-%S}.json"
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.success(f"Results written to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
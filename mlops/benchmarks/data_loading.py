@@ -0,0 +1,204 @@
+import datetime
+import itertools
+import json
+import os
+from pathlib import Path
+import platform
+import resource
+import time
+
+import cv2
+import hydra
+from loguru import logger
+import numpy as np
+from omegaconf import DictConfig, OmegaConf
+import torch
+from torchvision import transforms
+
+from mlops.dataset import create_dataloader
+from mlops.src.data.augmentation import BatchAugment
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+def generate_dataset(root: Path, num_pairs: int, size: int, seed: int = 0):
+    """
+    Write a synthetic paired dataset usable by both dataset classes.
+
+    Pix2PixHDDataset reads ``sketches/`` + ``images/``; ``mlops.dataset.Dataset`` reads
+    ``train/sketch`` + ``train/photo``. Images are smooth gradients with random strokes so
+    that JPEG decode cost is close to real photos rather than to pure noise.
+    """
+    dirs = [
+        root / "sketches",
+        root / "images",
+        root / "train" / "sketch",
+        root / "train" / "photo",
+    ]
+    if all(d.exists() and len(os.listdir(d)) >= num_pairs for d in dirs):
+        return
+    for d in dirs:
+        d.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    for i in range(num_pairs):
+        photo = np.stack([ramp[None, :].repeat(size, 0), ramp[:, None].repeat(size, 1)], -1)
+        photo = np.concatenate([photo, np.full((size, size, 1), rng.integers(0, 255))], -1)
+        photo = photo.astype(np.uint8)
+        sketch = np.full((size, size, 3), 255, np.uint8)
+        for _ in range(20):
+            p1, p2 = rng.integers(0, size, 2), rng.integers(0, size, 2)
+            cv2.line(sketch, tuple(map(int, p1)), tuple(map(int, p2)), (0, 0, 0), 2)
+            cv2.line(photo, tuple(map(int, p1)), tuple(map(int, p2)), (20, 20, 20), 3)
+        name = f"{i:05d}.jpg"
+        cv2.imwrite(str(dirs[0] / name), sketch)
+        cv2.imwrite(str(dirs[1] / name), photo)
+        cv2.imwrite(str(dirs[2] / name), sketch)
+        cv2.imwrite(str(dirs[3] / name), photo)
+
+
+def time_stages(files: list[str], img_size: int) -> dict[str, float]:
+    """Mean per-image latency in milliseconds of each step of the per-sample pipeline."""
+    to_tensor = transforms.Compose(
+        [transforms.ToTensor(), transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))]
+    )
+    totals = dict.fromkeys(["open", "decode", "color", "resize", "flip", "to_tensor"], 0.0)
+    for f_name in files:
+        t0 = time.perf_counter()
+        with open(f_name, "rb") as f:
+            buf = np.frombuffer(f.read(), np.uint8)
+        t1 = time.perf_counter()
+        img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        if img is None:
+            raise FileNotFoundError(f"Could not decode image {f_name}")
+        t2 = time.perf_counter()
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        t3 = time.perf_counter()
+        img = cv2.resize(img, (img_size, img_size))
+        t4 = time.perf_counter()
+        img = np.fliplr(img).copy()
+        t5 = time.perf_counter()
+        to_tensor(img)
+        t6 = time.perf_counter()
+        for key, dt in zip(totals, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5)):
+            totals[key] += dt
+    return {k: 1000 * v / len(files) for k, v in totals.items()}
+
+
+def _cpu_seconds(who: int) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure_loader(loader, num_workers: int, max_batches: int, batch_augment=None) -> dict:
+    """Iterate a loader and report throughput and loader CPU utilization."""
+    # Worker CPU time is only accounted to RUSAGE_CHILDREN once the workers are reaped,
+    # which happens when the iterator is released below
+    who = resource.RUSAGE_CHILDREN if num_workers > 0 else resource.RUSAGE_SELF
+    cpu_before = _cpu_seconds(who)
+    start = time.perf_counter()
+    samples = 0
+    it = iter(loader)
+    for batch in itertools.islice(it, max_batches):
+        src, dst = (batch["sketch"], batch["real"]) if isinstance(batch, dict) else batch
+        if batch_augment is not None:
+            src, dst = batch_augment(src, dst)
+        samples += src.shape[0]
+    wall = time.perf_counter() - start
+    del it
+    cpu = _cpu_seconds(who) - cpu_before
+    return {
+        "samples": samples,
+        "seconds": wall,
+        "samples_per_sec": samples / wall if wall > 0 else 0.0,
+        "loader_cpu_percent": 100 * cpu / wall / max(num_workers, 1) if wall > 0 else 0.0,
+    }
+
+
+def build_loader(kind: str, root: Path, img_size: int, batch_size: int, workers: int, pin: bool):
+    if kind == "dataset":
+        transform = transforms.Compose(
+            [transforms.Resize((img_size, img_size)), transforms.ToTensor()]
+        )
+        return create_dataloader(
+            str(root), "train", batch_size, transform, num_workers=workers, pin_memory=pin
+        )
+    dataset = Pix2PixHDDataset(
+        str(root),
+        "sketches/",
+        "images/",
+        img_size=img_size,
+        batch_augment=kind == "pix2pixhd_batch_augment",
+    )
+    return torch.utils.data.DataLoader(
+        dataset, batch_size=batch_size, num_workers=workers, pin_memory=pin, shuffle=True
+    )
+
+
+@hydra.main(config_path="../config", config_name="config", version_base=None)
+def main(cfg: DictConfig):
+    bench = cfg.benchmark.data_loading
+    data_dir = Path(bench.data_dir)
+    output_dir = Path(cfg.benchmark.output_dir)
+
+    logger.info(f"Generating {bench.num_pairs} synthetic pairs in {data_dir}...")
+    generate_dataset(data_dir, bench.num_pairs, bench.source_size, seed=cfg.benchmark.seed)
+    sketches = sorted(str(p) for p in (data_dir / "sketches").glob("*.jpg"))
+
+    results: dict = {
+        "benchmark": "data_loading",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+        },
+        "config": OmegaConf.to_container(bench),
+        "stages": [],
+        "loaders": [],
+    }
+
+    for img_size in bench.image_sizes:
+        stages = time_stages(sketches[: bench.stage_samples], img_size)
+        results["stages"].append({"image_size": img_size, "latency_ms": stages})
+        logger.info(
+            f"{img_size}px stages (ms): " + ", ".join(f"{k}={v:.2f}" for k, v in stages.items())
+        )
+
+    batch_augment = BatchAugment(horizontal_flip=0.5)
+    kinds = ["pix2pixhd", "pix2pixhd_batch_augment", "dataset"]
+    sweep = itertools.product(
+        kinds, bench.image_sizes, bench.num_workers, bench.batch_sizes, bench.pin_memory
+    )
+    for kind, img_size, workers, batch_size, pin in sweep:
+        loader = build_loader(kind, data_dir, img_size, batch_size, workers, pin)
+        row = measure_loader(
+            loader,
+            workers,
+            bench.max_batches,
+            batch_augment if kind == "pix2pixhd_batch_augment" else None,
+        )
+        row.update(
+            loader=kind,
+            image_size=img_size,
+            num_workers=workers,
+            batch_size=batch_size,
+            pin_memory=pin,
+        )
+        results["loaders"].append(row)
+        logger.info(
+            f"{kind:<24} size={img_size:<4} workers={workers} batch={batch_size:<3} pin={pin!s:<5} "
+            f"{row['samples_per_sec']:8.1f} samples/s  cpu={row['loader_cpu_percent']:5.1f}%"
+        )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_path = output_dir / f"data_loading_{datetime.datetime.now():%Y-%m-%d-%H-%M-%S}.json"
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.success(f"Results written to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
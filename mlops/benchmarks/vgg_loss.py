@@ -0,0 +1,95 @@
+import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import time
+from typing import Any
+
+import hydra
+from loguru import logger
+from omegaconf import DictConfig, OmegaConf
+import torch
+
+from mlops.src.components.losses import VGGLoss
+
+# (name, VGGLoss options) of every measured mode; "baseline" is the two-pass fp32 loss
+MODES: list[tuple[str, dict[str, Any]]] = [
+    ("baseline", {}),
+    ("fused", {"fused": True}),
+    ("fused_channels_last", {"fused": True, "channels_last": True}),
+    ("fused_bf16", {"fused": True, "precision": "bf16"}),
+    ("fused_bf16_channels_last", {"fused": True, "precision": "bf16", "channels_last": True}),
+]
+
+
+def time_loss(loss_fn: VGGLoss, x: torch.Tensor, y: torch.Tensor, steps: int, warmup: int):
+    """Mean forward + backward time in milliseconds of one generator-step VGG loss."""
+    x = x.clone().requires_grad_(True)
+    timings = []
+    for i in range(warmup + steps):
+        start = time.perf_counter()
+        loss = loss_fn(x, y)
+        loss.backward()
+        x.grad = None
+        if i >= warmup:
+            timings.append(time.perf_counter() - start)
+    return 1000 * sum(timings) / len(timings), loss.item()
+
+
+@hydra.main(config_path="../config", config_name="config", version_base=None)
+def main(cfg: DictConfig):
+    bench = cfg.benchmark.vgg_loss
+    output_dir = Path(cfg.benchmark.output_dir)
+    torch.manual_seed(cfg.benchmark.seed)
+
+    # Weights do not change the cost; a random init (pretrained: false) avoids the download
+    reference = VGGLoss(pretrained=bench.pretrained)
+    results: dict = {
+        "benchmark": "vgg_loss",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "mkldnn_bf16": torch.backends.mkldnn.is_available(),
+        },
+        "config": OmegaConf.to_container(bench),
+        "modes": [],
+    }
+
+    for img_size in bench.image_sizes:
+        x = torch.rand(bench.batch_size, 3, img_size, img_size) * 2 - 1
+        y = torch.rand(bench.batch_size, 3, img_size, img_size) * 2 - 1
+        baseline_ms, baseline_loss = None, None
+        for name, options in MODES:
+            loss_fn = VGGLoss(pretrained=False, **options)
+            loss_fn.vgg.load_state_dict(reference.vgg.state_dict())
+            ms, value = time_loss(loss_fn, x, y, bench.steps, bench.warmup)
+            if baseline_ms is None:
+                baseline_ms, baseline_loss = ms, value
+            row = {
+                "mode": name,
+                "image_size": img_size,
+                "batch_size": bench.batch_size,
+                "step_ms": ms,
+                "speedup": baseline_ms / ms,
+                "loss": value,
+                "rel_loss_error": abs(value - baseline_loss) / baseline_loss,
+            }
+            results["modes"].append(row)
+            logger.info(
+                f"{name:<26} size={img_size:<4} {ms:9.1f} ms/step  x{row['speedup']:.2f}  "
+                f"rel_err={row['rel_loss_error']:.2e}"
+            )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_path = output_dir / f"vgg_loss_{datetime.datetime.now():%Y-%m-%d-%H-%M-%S}.json"
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.success(f"Results written to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
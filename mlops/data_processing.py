@@ -1,3 +1,5 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
 from pathlib import Path
 import shutil
 from typing import Optional
@@ -8,18 +10,20 @@ from omegaconf import DictConfig
 from PIL import Image
 from tqdm import tqdm
 
+from mlops.src.data.file_ledger import FileLedger, fingerprint
+from mlops.src.data.pyramid import level_dir
 
-def process_image(input_path: Path, output_path: Path, size: Optional[int] = None):
-    """Process a single image (resize, convert RGB, save)."""
+
+def process_image_sizes(input_path: Path, outputs: list[tuple[Path, Optional[int]]]):
+    """Decode an image once and save an RGB copy per (output path, size) entry."""
     try:
         with Image.open(input_path) as img:
             img = img.convert("RGB")
 
-            if size is not None:
-                img = img.resize((size, size))
-
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            img.save(output_path)
+            for output_path, size in outputs:
+                out = img.resize((size, size)) if size is not None else img
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                out.save(output_path)
 
         return True
 
@@ -28,43 +32,170 @@ def process_image(input_path: Path, output_path: Path, size: Optional[int] = Non
         return False
 
 
+def process_image(input_path: Path, output_path: Path, size: Optional[int] = None):
+    """Process a single image (resize, convert RGB, save)."""
+    return process_image_sizes(input_path, [(output_path, size)])
+
+
+def process_pair(
+    sketch_path: Path,
+    image_path: Path,
+    sketch_outputs: list[tuple[Path, Optional[int]]],
+    image_outputs: list[tuple[Path, Optional[int]]],
+):
+    """Process one (sketch, image) pair in a worker and fingerprint its raw files."""
+    ok = process_image_sizes(sketch_path, sketch_outputs) and process_image_sizes(
+        image_path, image_outputs
+    )
+    if not ok:
+        return False, None, None
+    return True, fingerprint(str(sketch_path)), fingerprint(str(image_path))
+
+
+def prune_outputs(folders: list[Path], expected: set[Path]) -> int:
+    """Delete files in ``folders`` that are not in ``expected``; returns how many."""
+    removed = 0
+    for folder in folders:
+        if not folder.is_dir():
+            continue
+        for path in folder.iterdir():
+            if path.is_file() and path not in expected:
+                path.unlink()
+                removed += 1
+    return removed
+
+
+def preprocess(
+    raw_data: Path,
+    processed_sketch: Path,
+    processed_image: Path,
+    size: Optional[int],
+    ledger: FileLedger,
+    pyramid_dir: Optional[str] = None,
+    pyramid_sizes: Optional[list[int]] = None,
+    num_workers: int = 1,
+) -> dict[str, int]:
+    """
+    Bring the processed folders in line with the raw pairs.
+
+    Pairs whose raw files are unchanged (see :class:`FileLedger`) and whose outputs all
+    exist are skipped. Outputs and ledger entries of raw files that were deleted or
+    renamed are removed, as are pyramid levels no longer in ``pyramid_sizes``.
+
+    Returns:
+        Counts of ``processed``, ``failed``, ``skipped`` pairs and ``pruned`` files
+
+    Raises:
+        ValueError: If ``pyramid_sizes`` is given without ``pyramid_dir``
+    """
+    levels: list[tuple[int, Path]] = []
+    if pyramid_sizes:
+        if pyramid_dir is None:
+            raise ValueError("pyramid_sizes requires a pyramid_dir")
+        levels = [(level, level_dir(pyramid_dir, level)) for level in pyramid_sizes]
+    processed_sketch.mkdir(parents=True, exist_ok=True)
+    processed_image.mkdir(parents=True, exist_ok=True)
+
+    sketch_paths = sorted((raw_data / "sketches").glob("*"))
+    image_paths = sorted((raw_data / "images").glob("*"))
+
+    logger.info(f"Found {len(sketch_paths)} sketches and {len(image_paths)} images.")
+
+    # Only pairs whose raw files changed (or whose outputs went missing) are redone
+    tasks = []
+    expected: set[Path] = set()
+    raw_files: set[str] = set()
+    for sketch_path, image_path in zip(sketch_paths, image_paths):
+        raw_files.update((str(sketch_path), str(image_path)))
+        # Every resolution of the pyramid is written from a single decode of the raw file
+        sketch_outputs = [(processed_sketch / sketch_path.name, size)]
+        image_outputs = [(processed_image / image_path.name, size)]
+        for level, directory in levels:
+            sketch_outputs.append((directory / "sketches" / sketch_path.name, level))
+            image_outputs.append((directory / "images" / image_path.name, level))
+        expected.update(out for out, _ in sketch_outputs + image_outputs)
+        if (
+            ledger.is_current(str(sketch_path))
+            and ledger.is_current(str(image_path))
+            and all(out.exists() for out, _ in sketch_outputs + image_outputs)
+        ):
+            continue
+        tasks.append((sketch_path, image_path, sketch_outputs, image_outputs))
+
+    # Drop what belongs to raw files that no longer exist (or no longer pair up)
+    output_dirs = [processed_sketch, processed_image]
+    if pyramid_dir is not None and Path(pyramid_dir).is_dir():
+        configured = {level for level, _ in levels}
+        for path in Path(pyramid_dir).iterdir():
+            if path.is_dir() and path.name.isdigit() and int(path.name) not in configured:
+                shutil.rmtree(path)
+        for _, directory in levels:
+            output_dirs += [directory / d for d in ("sketches", "images")]
+    pruned = prune_outputs(output_dirs, expected)
+    ledger.prune(raw_files)
+    if pruned:
+        logger.info(f"Removed {pruned} processed files without a raw pair.")
+
+    skipped = min(len(sketch_paths), len(image_paths)) - len(tasks)
+    logger.info(f"{skipped} pairs up to date, processing {len(tasks)} with {num_workers} workers.")
+
+    success = 0
+    try:
+        if tasks:
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                results = pool.map(
+                    process_pair, *zip(*tasks), chunksize=max(1, len(tasks) // (num_workers * 16))
+                )
+                for task, (ok, sketch_fp, image_fp) in tqdm(zip(tasks, results), total=len(tasks)):
+                    if ok:
+                        ledger.record(str(task[0]), sketch_fp)
+                        ledger.record(str(task[1]), image_fp)
+                        success += 1
+    finally:
+        ledger.save()
+
+    return {
+        "processed": success,
+        "failed": len(tasks) - success,
+        "skipped": skipped,
+        "pruned": pruned,
+    }
+
+
 @hydra.main(version_base=None, config_path="config", config_name="config")
 def main(cfg: DictConfig):
-    raw_data = Path(cfg.dataset.raw_dir)
     processed_sketch = Path(cfg.dataset.processed_sketch_dir)
     processed_image = Path(cfg.dataset.processed_image_dir)
     size = cfg.dataset.resize
+    pyramid_dir = cfg.dataset.pyramid_dir
+    pyramid_sizes = list(cfg.dataset.pyramid_sizes)
+    ledger = FileLedger(
+        str(Path(cfg.paths.interim) / "preprocess_ledger.json"),
+        params={"resize": size, "pyramid_sizes": pyramid_sizes},
+    )
 
     # Clean processed dirs
     if cfg.dataset.clean_processed:
         logger.info("Cleaning processed directory...")
         shutil.rmtree(processed_sketch, ignore_errors=True)
         shutil.rmtree(processed_image, ignore_errors=True)
-
-    processed_sketch.mkdir(parents=True, exist_ok=True)
-    processed_image.mkdir(parents=True, exist_ok=True)
-
-    sketch_dir = raw_data / "sketches"
-    image_dir = raw_data / "images"
-
-    sketch_paths = sorted(sketch_dir.glob("*"))
-    image_paths = sorted(image_dir.glob("*"))
-
-    logger.info(f"Found {len(sketch_paths)} sketches and {len(image_paths)} images.")
-
-    success = 0
-
-    for sketch_path, image_path in tqdm(zip(sketch_paths, image_paths), total=len(sketch_paths)):
-        sketch_out = processed_sketch / sketch_path.name
-        image_out = processed_image / image_path.name
-
-        ok1 = process_image(sketch_path, sketch_out, size)
-        ok2 = process_image(image_path, image_out, size)
-
-        if ok1 and ok2:
-            success += 1
-
-    logger.success(f"Processing complete. {success}/{len(sketch_paths)} pairs processed.")
+        shutil.rmtree(pyramid_dir, ignore_errors=True)
+        ledger.clear()
+
+    stats = preprocess(
+        Path(cfg.dataset.raw_dir),
+        processed_sketch,
+        processed_image,
+        size,
+        ledger,
+        pyramid_dir=pyramid_dir,
+        pyramid_sizes=pyramid_sizes,
+        num_workers=cfg.dataset.preprocess_workers or os.cpu_count() or 1,
+    )
+    logger.success(
+        f"Processing complete. {stats['processed']}/{stats['processed'] + stats['failed']} "
+        f"pairs processed, {stats['skipped']} unchanged, {stats['pruned']} stale files removed."
+    )
 
 
 if __name__ == "__main__":
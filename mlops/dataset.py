@@ -1,16 +1,22 @@
 import os
 from pathlib import Path
+from typing import Optional
 
+import numpy as np
 from PIL import Image
 import torch
 from torch.utils.data import DataLoader
 
+from mlops.src.data.augmentation import BatchAugment
+
 
 class Dataset(torch.utils.data.Dataset):
-    def __init__(self, root_dir, split="train", transform=None):
+    def __init__(self, root_dir, split="train", transform=None, raw=False):
         self.root_dir = Path(root_dir)
         self.split = split
         self.transform = transform
+        # Return uint8 CHW tensors for a batched augmentation stage instead of PIL images
+        self.raw = raw
 
         self.sketch_dir = self.root_dir / split / "sketch"
         self.real_dir = self.root_dir / split / "photo"
@@ -33,14 +39,59 @@ class Dataset(torch.utils.data.Dataset):
             sketch = self.transform(sketch)
             real = self.transform(real)
 
+        if self.raw:
+            return {
+                "sketch": torch.from_numpy(np.asarray(sketch).copy()).permute(2, 0, 1),
+                "real": torch.from_numpy(np.asarray(real).copy()).permute(2, 0, 1),
+            }
+
         return {"sketch": sketch, "real": real}
 
 
-def create_dataloader(root_dir, split, batch_size, transform, shuffle=True):
-    dataset = Dataset(root_dir=root_dir, split=split, transform=transform)
+class AugmentedLoader:
+    """Wrap a DataLoader of raw pairs and apply a :class:`BatchAugment` to each batch."""
+
+    def __init__(self, loader: DataLoader, augment: BatchAugment, device=None):
+        self.loader = loader
+        self.augment = augment
+        self.device = device
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        for batch in self.loader:
+            sketch, real = batch["sketch"], batch["real"]
+            if self.device is not None:
+                sketch = sketch.to(self.device, non_blocking=True)
+                real = real.to(self.device, non_blocking=True)
+            with torch.no_grad():
+                sketch, real = self.augment(sketch, real)
+            yield {"sketch": sketch, "real": real}
+
+
+def create_dataloader(
+    root_dir,
+    split,
+    batch_size,
+    transform,
+    shuffle=True,
+    augment: Optional[BatchAugment] = None,
+    num_workers=4,
+    pin_memory=True,
+):
+    # With a batched augmentation stage, workers only decode; the transform should then
+    # produce same-sized PIL images (e.g. a Resize) so that raw batches can be collated
+    dataset = Dataset(root_dir=root_dir, split=split, transform=transform, raw=augment is not None)
 
     dataloader = DataLoader(
-        dataset, batch_size=batch_size, shuffle=shuffle, num_workers=4, pin_memory=True
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
     )
 
+    if augment is not None:
+        return AugmentedLoader(dataloader, augment)
     return dataloader
@@ -6,10 +6,16 @@ import shutil
 import kagglehub
 
 
-def prepare_data(n=200):
+def locate_edges2shoes() -> str:
+    """Return the kagglehub cache directory of edges2shoes, downloading it if needed."""
     print("Downloading/Checking dataset via KaggleHub...")
-    edges2shoes_path = kagglehub.dataset_download("balraj98/edges2shoes-dataset")
+    edges2shoes_path = str(kagglehub.dataset_download("balraj98/edges2shoes-dataset"))
     print(f"Dataset path: {edges2shoes_path}")
+    return edges2shoes_path
+
+
+def prepare_data(n=200):
+    edges2shoes_path = locate_edges2shoes()
 
     train_path = os.path.join(edges2shoes_path, "train")
     valid_path = os.path.join(edges2shoes_path, "val")
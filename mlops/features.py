@@ -1,5 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import json
+import os
 from pathlib import Path
+from typing import Any, Optional
 
 import hydra
 from loguru import logger
@@ -7,6 +11,8 @@ from omegaconf import DictConfig
 from PIL import Image
 from tqdm import tqdm
 
+from mlops.src.data.file_ledger import FileLedger, fingerprint
+
 
 def load_image(path: Path, size=(256, 256)):
     """Load and preprocess an image from the given path."""
@@ -16,41 +22,112 @@ def load_image(path: Path, size=(256, 256)):
     return image
 
 
+def read_header(path: Path) -> tuple[int, int]:
+    """Read image dimensions from the file header without decoding any pixels."""
+    with Image.open(path) as image:
+        return image.size
+
+
+def validate_image(
+    path: Path, mode: str = "header", known: Optional[dict[str, dict[str, Any]]] = None
+) -> dict[str, Any]:
+    """
+    Check that an image opens and return its fingerprint plus the outcome.
+
+    Args:
+        path: Image to validate
+        mode: 'header' reads only the header, 'full' decodes and resizes the image
+        known: Previous results keyed by content hash, reused for renamed or copied files
+
+    Returns:
+        Fingerprint of the file with ``ok``, ``width`` and ``height`` fields
+    """
+    fp = fingerprint(str(path))
+    if known is not None and fp["sha1"] in known:
+        prev = known[fp["sha1"]]
+        return {**fp, "ok": prev["ok"], "width": prev.get("width"), "height": prev.get("height")}
+    try:
+        if mode == "full":
+            width, height = load_image(path).size
+        else:
+            width, height = read_header(path)
+        return {**fp, "ok": True, "width": width, "height": height}
+    except Exception as e:
+        logger.error(f"Error validating {path.name}: {e}")
+        return {**fp, "ok": False}
+
+
+def validate_files(
+    files: list[Path], cache: FileLedger, mode: str = "header", num_workers: int = 1
+) -> list[Path]:
+    """
+    Validate the files that are new or changed since they were recorded in ``cache``.
+
+    Results are recorded in ``cache``, which is saved afterwards.
+
+    Returns:
+        The files that were validated
+    """
+    todo = [f for f in files if not cache.is_current(str(f))]
+    logger.info(
+        f"Validating {len(todo)} new or changed files ({mode} mode, {num_workers} workers)."
+    )
+    known = {e["sha1"]: e for e in cache.entries.values()}
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            results = pool.map(partial(validate_image, mode=mode, known=known), todo)
+            for file, result in tqdm(zip(todo, results), total=len(todo)):
+                cache.record(str(file), result)
+    finally:
+        cache.save()
+    return todo
+
+
 @hydra.main(config_path="config", config_name="config", version_base=None)
 def main(cfg: DictConfig):
     sketch_path = Path(cfg.paths.processed) / "sketch"
     photo_path = Path(cfg.paths.processed) / "photo"
     output_features_path = Path(cfg.paths.interim) / "pairs.json"
+    mode: str = cfg.dataset.validation_mode
+    num_workers = cfg.dataset.validation_workers or min(32, (os.cpu_count() or 1) * 4)
+    cache = FileLedger(
+        str(Path(cfg.paths.interim) / "validation_cache.json"), params={"mode": mode}
+    )
 
     logger.info("Generating features from dataset...")
 
-    pairs = []
     sketch_files = sorted(sketch_path.glob("*.jpg"))
     logger.info(f"Found {len(sketch_files)} sketch files.")
 
-    for sketch_file in tqdm(sketch_files):
+    candidates = []
+    for sketch_file in sketch_files:
         base = sketch_file.stem
         real_image = photo_path / f"{base}.jpg"
         if not real_image.exists():
             logger.warning(f"Real image not found for sketch: {sketch_file.name}")
             continue
-        try:
-            load_image(sketch_file)
-            load_image(real_image)
+        candidates.append((sketch_file, real_image))
+
+    validate_files(
+        [f for pair in candidates for f in pair], cache, mode=mode, num_workers=num_workers
+    )
 
+    pairs = []
+    for sketch_file, real_image in candidates:
+        if cache.entries[str(sketch_file)]["ok"] and cache.entries[str(real_image)]["ok"]:
             pairs.append(
                 {
                     "sketch_path": str(sketch_file),
                     "real_path": str(real_image),
                 }
             )
-        except Exception as e:
-            logger.error(f"Error processing {sketch_file.name}: {e}")
+        else:
+            logger.error(f"Error processing {sketch_file.name}: image could not be opened")
 
     output_features_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_features_path, "w") as f:
         json.dump(pairs, f, indent=2)
-    logger.success("Features generation complete.")
+    logger.success(f"Features generation complete. {len(pairs)}/{len(candidates)} valid pairs.")
 
 
 if __name__ == "__main__":
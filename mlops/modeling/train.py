@@ -1,6 +1,10 @@
+from contextlib import AbstractContextManager, nullcontext
 import json
 from pathlib import Path
-from typing import Optional
+import signal
+import sys
+import time
+from typing import Optional, Union
 
 import hydra
 from hydra.utils import get_original_cwd
@@ -8,14 +12,31 @@ from loguru import logger
 import mlflow
 from omegaconf import DictConfig
 import torch
+from torch.utils.data import Subset
 
+from mlops.src.components.checkpoint import CheckpointManager
+from mlops.src.components.compilation import compile_modules, enable_compile_cache
 from mlops.src.components.discriminator import define_D
+from mlops.src.components.distributed import (
+    cleanup_distributed,
+    main_process_first,
+    setup_distributed,
+)
+from mlops.src.components.feature_cache import VGGFeatureCache
 from mlops.src.components.generator import define_G
 from mlops.src.components.losses import GANLoss, VGGLoss
 from mlops.src.components.replay_pool import ReplayPool
+from mlops.src.data.augmentation import BatchAugment
+from mlops.src.data.edges2shoes import Edges2ShoesDataset
+from mlops.src.data.sampler import ResumableSampler
 from mlops.src.models.pix2pixhd_module import Pix2PixHD, Pix2PixHDDataset
 
 
+def ignore_sigterm(worker_id: int):
+    """Keep loader workers alive on SIGTERM so the main process can snapshot and stop."""
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
 @hydra.main(config_path="../config", config_name="config", version_base=None)
 def main(cfg: DictConfig):
     # ---- Dataset paths ----
@@ -46,14 +67,44 @@ def main(cfg: DictConfig):
     learning_rate: float = cfg.training.learning_rate
     lambda_feat: float = cfg.training.lambda_feat
     replay_pool_size: int = cfg.training.replay_pool_size
-    # ema_decay: float = cfg.training.ema_decay
+    reuse_fake: bool = cfg.training.reuse_generator_output
+    fuse_discriminator: bool = cfg.training.fuse_discriminator
+    log_every_n_steps: int = cfg.training.log_every_n_steps
+    precision = str(cfg.training.precision)
+    accumulate_grad_batches: int = cfg.training.accumulate_grad_batches
+    ckpt_cfg = cfg.training.checkpoint
+    compile_cfg = cfg.training.compile
+    dist_cfg = cfg.training.distributed
+    ema_cfg = cfg.training.ema
+    vgg_cfg = cfg.training.vgg_loss
+    vgg_cache_cfg = cfg.training.vgg_cache
     # ---- Data config ----
+    backend: str = cfg.dataset.backend
     img_size: int = cfg.dataset.image_size
     num_workers: int = cfg.dataset.num_workers
+    batch_augment: bool = cfg.dataset.batch_augment
+    cache_bytes = int(cfg.dataset.shared_cache_bytes)
+    aug_cfg = cfg.dataset.augmentation
+    manifest_path = str(project_root / cfg.dataset.manifest_path)
+    refresh_manifest: bool = cfg.dataset.refresh_manifest
+    pyramid_dir: Optional[str] = (
+        str(project_root / cfg.dataset.pyramid_dir) if cfg.dataset.pyramid_sizes else None
+    )
+    shard_dir: Optional[str] = (
+        str(project_root / cfg.dataset.shard_dir) if cfg.dataset.use_shards else None
+    )
     # ---- Training control ----
     # test_interval: int = cfg.training.test_interval
     # save_interval: int = cfg.training.save_interval
     resume_from: Optional[Path] = cfg.training.resume_from
+    augment = BatchAugment.from_config(aug_cfg) if batch_augment else None
+    # Cached target features are keyed by sample index and flip, which needs the batched
+    # augmentation stage and no continuous random augmentation
+    use_vgg_cache: bool = vgg_cache_cfg.enable and augment is not None and augment.cacheable
+    if vgg_cache_cfg.enable and not use_vgg_cache:
+        logger.warning(
+            "VGG feature cache needs dataset.batch_augment and flip-only augmentation; disabled"
+        )
 
     """
     Train Pix2PixHD model for image-to-image translation.
@@ -62,6 +113,12 @@ def main(cfg: DictConfig):
     sets up loss functions, and trains the model using the Pix2PixHD training pipeline.
     """
 
+    # Join the process group when launched with torchrun; only rank 0 logs progress
+    dist_ctx = setup_distributed(dist_cfg.backend, dist_cfg.threads_per_process)
+    if not dist_ctx.is_main:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
     # Setup logging
     logger.info("=" * 80)
     logger.info("Starting Pix2PixHD Training")
@@ -75,32 +132,98 @@ def main(cfg: DictConfig):
         if torch.cuda.is_available()
         else "cpu"
     )
+    if dist_ctx.enabled:
+        device = (
+            torch.device("cuda", dist_ctx.local_rank)
+            if torch.cuda.is_available()
+            else torch.device("cpu")
+        )
+        logger.info(
+            f"Distributed training: {dist_ctx.world_size} processes "
+            f"({dist_ctx.local_world_size} per host, {torch.get_num_threads()} threads each)"
+        )
     logger.info(f"Using device: {device}")
 
     try:
         # ---- Create dataset and dataloaders ----
-        logger.info(f"Loading dataset from {dataset_path}")
-        logger.info(f"Images directory: {images_dir}")
-        logger.info(f"Feature folder: {feature_folder}")
-        logger.info(f"Label folder: {label_folder}")
-        train_dataset = Pix2PixHDDataset(
-            images_dir=images_dir,
-            feature_fold="sketches/",
-            label_fold="images/",
-            img_size=img_size,
-        )
+        train_dataset: Pix2PixHDDataset
+        train_ds: Union[Pix2PixHDDataset, Subset]
+        test_ds: Union[Pix2PixHDDataset, Subset]
+        # Rank 0 builds manifests and caches first, the other ranks then reuse them
+        with main_process_first(dist_ctx):
+            if backend == "edges2shoes":
+                from mlops.download_and_prepare_data import locate_edges2shoes
+
+                edges2shoes_dir = cfg.dataset.edges2shoes_dir or locate_edges2shoes()
+                logger.info(f"Streaming side-by-side pairs from {edges2shoes_dir}")
+                train_dataset = Edges2ShoesDataset(
+                    edges2shoes_dir,
+                    split="train",
+                    img_size=img_size,
+                    batch_augment=batch_augment,
+                    cache_bytes=cache_bytes,
+                    return_key=use_vgg_cache,
+                )
+                train_ds = train_dataset
+                test_ds = Edges2ShoesDataset(
+                    edges2shoes_dir, split="val", img_size=img_size, batch_augment=batch_augment
+                )
+            else:
+                logger.info(f"Loading dataset from {dataset_path}")
+                logger.info(f"Images directory: {images_dir}")
+                logger.info(f"Feature folder: {feature_folder}")
+                logger.info(f"Label folder: {label_folder}")
+                if shard_dir is not None:
+                    logger.info(f"Reading pre-decoded pairs from shard store: {shard_dir}")
+                train_dataset = Pix2PixHDDataset(
+                    images_dir=images_dir,
+                    feature_fold="sketches/",
+                    label_fold="images/",
+                    img_size=img_size,
+                    shard_dir=shard_dir,
+                    manifest_path=manifest_path,
+                    refresh_manifest=refresh_manifest,
+                    batch_augment=batch_augment,
+                    cache_bytes=cache_bytes,
+                    pyramid_dir=pyramid_dir,
+                    return_key=use_vgg_cache,
+                )
+                if train_dataset.imagesDir != images_dir:
+                    logger.info(f"Reading pre-resized images from {train_dataset.imagesDir}")
+
+                # Create train/test split
+                train_size = int(0.8 * len(train_dataset))
+                test_size = len(train_dataset) - train_size
+                train_ds, test_ds = torch.utils.data.random_split(
+                    train_dataset,
+                    [train_size, test_size],
+                    generator=torch.Generator().manual_seed(cfg.seed),
+                )
         logger.info(f"Dataset size: {len(train_dataset)}")
-
-        # Create train/test split
-        train_size = int(0.8 * len(train_dataset))
-        test_size = len(train_dataset) - train_size
-        train_ds, test_ds = torch.utils.data.random_split(train_dataset, [train_size, test_size])
-
+        if train_dataset.cache is not None:
+            logger.info(
+                f"Shared sample cache: {train_dataset.cache.num_slots} slots "
+                f"for {len(train_dataset)} samples"
+            )
+
+        # Each rank reads its own shard of every epoch
+        train_sampler = ResumableSampler(
+            train_ds, seed=cfg.seed, num_replicas=dist_ctx.world_size, rank=dist_ctx.rank
+        )
         train_loader = torch.utils.data.DataLoader(
-            train_ds, batch_size=batch_size, num_workers=num_workers, shuffle=True, drop_last=True
+            train_ds,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            sampler=train_sampler,
+            drop_last=True,
+            worker_init_fn=ignore_sigterm,
         )
         test_loader = torch.utils.data.DataLoader(
-            test_ds, batch_size=batch_size, num_workers=num_workers, shuffle=True
+            test_ds,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            shuffle=True,
+            worker_init_fn=ignore_sigterm,
         )
         logger.info(f"Train size: {len(train_ds)}, Test size: {len(test_ds)}")
 
@@ -117,6 +240,7 @@ def main(cfg: DictConfig):
             n_local_enhancers=n_local_enhancers,
             n_blocks_local=n_blocks_local,
             gpu_ids=[],
+            checkpointing=cfg.model.generator.checkpointing,
         ).to(device)
         logger.success("Generator initialized")
 
@@ -139,7 +263,30 @@ def main(cfg: DictConfig):
         logger.info("Initializing loss functions...")
         criterion_gan = GANLoss(use_lsgan=True).to(device)
         criterion_feat = torch.nn.L1Loss().to(device)
-        criterion_vgg = VGGLoss().to(device)
+        feature_cache = None
+        if use_vgg_cache:
+            # Rank 0 clears a cache written with other settings before the others open it
+            with main_process_first(dist_ctx):
+                feature_cache = VGGFeatureCache(
+                    str(project_root / vgg_cache_cfg.dir),
+                    int(vgg_cache_cfg.max_bytes),
+                    dtype=vgg_cache_cfg.dtype,
+                    params={
+                        "precision": str(vgg_cfg.precision),
+                        "channels_last": vgg_cfg.channels_last,
+                        "dataset": backend,
+                        "image_size": img_size,
+                    },
+                )
+            logger.info(
+                f"VGG feature cache: {len(feature_cache)} entries in {feature_cache.cache_dir}"
+            )
+        criterion_vgg = VGGLoss(
+            feature_cache=feature_cache,
+            fused=vgg_cfg.fused,
+            precision=str(vgg_cfg.precision),
+            channels_last=vgg_cfg.channels_last,
+        ).to(device)
         logger.success("Loss functions initialized")
 
         # ---- Create replay buffer ----
@@ -157,27 +304,73 @@ def main(cfg: DictConfig):
             criterion_vgg=criterion_vgg,
             replay_pool=replay_pool,
             device=device,
+            batch_augment=augment,
             checkpoint_dir=str(checkpoint_dir),
             lambda_feat=lambda_feat,
+            reuse_fake=reuse_fake,
+            fuse_discriminator=fuse_discriminator,
+            log_every_n_steps=log_every_n_steps,
+            ema_decay=ema_cfg.decay,
+            ema_update_every=ema_cfg.update_every,
+            ema_warmup_steps=ema_cfg.warmup_steps,
+            precision=precision,
+            accumulate_grad_batches=accumulate_grad_batches,
+            checkpoint_manager=CheckpointManager(
+                str(checkpoint_dir),
+                save_top_k=ckpt_cfg.save_top_k,
+                save_last=ckpt_cfg.save_last,
+                monitor=ckpt_cfg.monitor,
+                mode=ckpt_cfg.mode,
+                is_main=dist_ctx.is_main,
+            ),
+            checkpoint_replay_pool=ckpt_cfg.replay_pool,
         )
+        if dist_ctx.enabled:
+            model.wrap_distributed(device_ids=[device.index] if device.type == "cuda" else None)
         logger.success("Pix2PixHD model initialized")
 
+        # ---- Compile networks ----
+        if compile_cfg.enable:
+            enable_compile_cache(str(project_root / compile_cfg.cache_dir))
+            compile_modules(
+                generator,
+                discriminator,
+                criterion_vgg.vgg,
+                backend=compile_cfg.backend,
+                mode=compile_cfg.mode,
+            )
+            # Compilation is lazy: run it now so the first epoch is not skewed by it
+            logger.info(f"Compiling networks with the {compile_cfg.backend} backend...")
+            start = time.perf_counter()
+            data, target = next(iter(train_loader))[:2]
+            model.warmup(data, target, steps=compile_cfg.warmup_steps)
+            logger.success(f"Networks compiled in {time.perf_counter() - start:.1f}s")
+
         # ---- Create optimizers ----
         logger.info(f"Creating optimizers with learning rate {learning_rate}...")
         g_optimizer = torch.optim.AdamW(generator.parameters(), lr=learning_rate)
         d_optimizer = torch.optim.AdamW(discriminator.parameters(), lr=learning_rate)
         logger.success("Optimizers created")
 
+        # On SIGTERM (preemption), snapshot the training state at the next optimizer step
+        # and stop; resume with training.resume_from=<checkpoint_dir>/last.pt
+        signal.signal(signal.SIGTERM, lambda signum, frame: model.request_stop())
+
         # ---- Load checkpoint if resuming ----
         start_epoch = 0
         if resume_from is not None:
             logger.info(f"Resuming training from checkpoint: {resume_from}")
-            model.load_checkpoint(str(resume_from))
+            sampler_state = model.load_checkpoint(str(resume_from), g_optimizer, d_optimizer)
+            if sampler_state is not None:
+                train_sampler.load_state_dict(sampler_state)
+                start_epoch = train_sampler.epoch
+                logger.info(f"Resuming epoch {start_epoch} at sample {train_sampler.offset}")
             logger.success("Checkpoint loaded")
 
         # ---- Training loop ----
         # 1. Setup MLflow
-        mlflow.set_experiment(cfg.experiment.name)
+        if dist_ctx.is_main:
+            mlflow.set_experiment(cfg.experiment.name)
 
         # 2. Setup WandB
         # wandb_config = OmegaConf.to_container(cfg, resolve=True, throw_on_missing=True)
@@ -198,12 +391,20 @@ def main(cfg: DictConfig):
         # logger.success(f"🚀 WANDB DASHBOARD IS LIVE AT: {run_url}")
         # logger.info("=" * 80)
 
-        with mlflow.start_run():
-            mlflow.log_param("num_epochs", num_epochs)
-            mlflow.log_param("batch_size", batch_size)
-            mlflow.log_param("learning_rate", learning_rate)
-            mlflow.log_param("ngf", ngf)
-            mlflow.log_param("ndf", ndf)
+        run: AbstractContextManager = nullcontext()
+        if dist_ctx.is_main:
+            run = mlflow.start_run()
+        with run:
+            if dist_ctx.is_main:
+                mlflow.log_param("num_epochs", num_epochs)
+                mlflow.log_param("batch_size", batch_size)
+                mlflow.log_param("accumulate_grad_batches", accumulate_grad_batches)
+                mlflow.log_param("learning_rate", learning_rate)
+                mlflow.log_param("ngf", ngf)
+                mlflow.log_param("ndf", ndf)
+                mlflow.log_param("precision", precision)
+                mlflow.log_param("compile", compile_cfg.enable)
+                mlflow.log_param("world_size", dist_ctx.world_size)
             logger.info("=" * 80)
             logger.info("Starting training loop")
             logger.info("=" * 80)
@@ -220,12 +421,13 @@ def main(cfg: DictConfig):
                         d_optimizer=d_optimizer,
                     )
 
-                    # 1. Log for MLflow
-                    for k, v in model.loss_log.items():
-                        mlflow.log_metric(k, v / len(train_loader), step=epoch)
+                    # 1. Log for MLflow (loss_log is already averaged over ranks)
+                    if dist_ctx.is_main:
+                        for k, v in model.loss_log.items():
+                            mlflow.log_metric(k, v / max(model.epoch_steps, 1), step=epoch)
 
                     # 2. Log for WandB
-                    # wandb_metrics = {k: v / len(train_loader) for k, v in model.loss_log.items()}
+                    # wandb_metrics = {k: v / model.epoch_steps for k, v in model.loss_log.items()}
                     # wandb_metrics["epoch"] = epoch
 
                     # wandb.log(wandb_metrics)  # type: ignore[attr-defined]
@@ -235,9 +437,23 @@ def main(cfg: DictConfig):
                     # wandb.finish()  # type: ignore[attr-defined]
                     raise
 
+                if model.preempted:
+                    break
+
+            # Let the background writers finish the last previews and checkpoints
+            model.close()
+            if model.preempted:
+                logger.warning(
+                    f"Stopped on SIGTERM at epoch {epoch + 1}, step {model.total_steps}; "
+                    f"resume with training.resume_from={checkpoint_dir / 'last.pt'}"
+                )
+                return
+
             logger.info("=" * 80)
             logger.success("Training completed successfully!")
             logger.info(f"Checkpoints saved to: {checkpoint_dir}")
+            if model.checkpoint_manager.best_path is not None:
+                logger.info(f"Best checkpoint: {model.checkpoint_manager.best_path}")
             logger.info("=" * 80)
 
             # Save metrics
@@ -245,10 +461,11 @@ def main(cfg: DictConfig):
                 "final_g_loss": float(model.loss_log.get("G_adv", 0)),
                 "final_d_loss": float(model.loss_log.get("D_true", 0)),
             }
-            metrics_path = project_root / "reports" / "metrics.json"
-            metrics_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(metrics_path, "w") as f:
-                json.dump(metrics, f)
+            if dist_ctx.is_main:
+                metrics_path = project_root / "reports" / "metrics.json"
+                metrics_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(metrics_path, "w") as f:
+                    json.dump(metrics, f)
 
             # End Wandb run
             # wandb.finish()  # type: ignore[attr-defined]
@@ -256,6 +473,8 @@ def main(cfg: DictConfig):
     except Exception as e:
         logger.error(f"Training failed: {str(e)}")
         raise
+    finally:
+        cleanup_distributed()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import hydra
+from loguru import logger
+from omegaconf import DictConfig
+from tqdm import tqdm
+
+from mlops.src.data.shard_store import write_shards
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+@hydra.main(config_path="config", config_name="config", version_base=None)
+def main(cfg: DictConfig):
+    images_dir = Path(cfg.paths.processed)
+    shard_dir = Path(cfg.dataset.shard_dir)
+    img_size: int = cfg.dataset.image_size
+    num_workers: int = cfg.dataset.num_workers
+
+    dataset = Pix2PixHDDataset(
+        images_dir=str(images_dir),
+        feature_fold="sketches/",
+        label_fold="images/",
+        img_size=img_size,
+        manifest_path=cfg.dataset.manifest_path,
+        refresh_manifest=cfg.dataset.refresh_manifest,
+    )
+    logger.info(f"Packing {len(dataset)} pairs at {img_size}px into {shard_dir}...")
+
+    # cv2 releases the GIL while decoding, so threads are enough to keep the disk busy
+    with ThreadPoolExecutor(max_workers=max(num_workers, 1)) as pool:
+        pairs = pool.map(dataset.load_pair, range(len(dataset)))
+        names = [Path(f_name).name for f_name in dataset.images]
+        write_shards(str(shard_dir), names, tqdm(pairs, total=len(dataset)), img_size)
+
+    logger.success(f"Shard store written to {shard_dir}.")
+
+
+if __name__ == "__main__":
+    main()
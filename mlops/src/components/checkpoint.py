@@ -0,0 +1,273 @@
+import json
+import os
+from pathlib import Path
+import random
+import threading
+from typing import Any, Optional, cast
+
+from loguru import logger
+import numpy as np
+import torch
+
+
+def rng_state() -> dict[str, Any]:
+    """
+    Capture the Python, NumPy and torch (CPU and CUDA) random number generators.
+
+    Only tensors and builtins are stored, so checkpoints load with ``weights_only=True``.
+    """
+    _, keys, pos, has_gauss, cached_gaussian = cast(
+        tuple[str, np.ndarray, int, int, float], np.random.get_state()
+    )
+    state = {
+        "python": random.getstate(),
+        "numpy": {
+            "keys": torch.from_numpy(keys.astype(np.int64)),
+            "pos": pos,
+            "has_gauss": has_gauss,
+            "cached_gaussian": cached_gaussian,
+        },
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: dict[str, Any]):
+    """Restore generators captured with :func:`rng_state`."""
+    random.setstate(state["python"])
+    numpy_state = state["numpy"]
+    np.random.set_state(
+        (
+            "MT19937",
+            numpy_state["keys"].numpy().astype(np.uint32),
+            numpy_state["pos"],
+            numpy_state["has_gauss"],
+            numpy_state["cached_gaussian"],
+        )
+    )
+    torch.set_rng_state(state["torch"].cpu())
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all([s.cpu() for s in state["cuda"]])
+
+
+def seed_rng(seed: int):
+    """Seed the Python, NumPy and torch generators, e.g. to give each rank its own stream."""
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    torch.manual_seed(seed)
+
+
+class CheckpointManager:
+    """
+    Write checkpoints on a background thread and keep only the best ones.
+
+    ``save`` copies the state into reusable CPU snapshot buffers and returns; a worker
+    thread serializes the snapshot to a temporary file and renames it into place, so a
+    crash never leaves a truncated checkpoint. At most one write is in flight: a ``save``
+    issued while the previous one is still writing waits for it, since the snapshot
+    buffers are shared.
+
+    Checkpoints are ranked by the monitored metric (by recency when no metric is given);
+    only the ``save_top_k`` best are kept and ``last.pt`` always points to the newest.
+    The ranking is stored in ``index.json`` next to the checkpoints, so a restarted run
+    keeps competing against (and evicting) the checkpoints of the previous one.
+
+    In distributed training every rank builds a manager, but only the main rank's touches
+    the directory; the others neither read the index nor write checkpoints.
+    """
+
+    LAST = "last.pt"
+    INDEX = "index.json"
+
+    def __init__(
+        self,
+        dirpath: str,
+        save_top_k: int = 3,
+        save_last: bool = True,
+        monitor: Optional[str] = None,
+        mode: str = "min",
+        is_main: bool = True,
+    ):
+        """
+        Initialize manager.
+
+        Args:
+            dirpath: Directory for the checkpoint files
+            save_top_k: Number of best checkpoints to keep; -1 keeps all, 0 only ``last.pt``
+            save_last: Also write the newest checkpoint to ``last.pt``
+            monitor: Name of the metric checkpoints are ranked by, for logging
+            mode: "min" or "max"; whether lower or higher metric values are better
+            is_main: Whether this process writes the checkpoints (rank 0)
+        """
+        if mode not in ("min", "max"):
+            raise ValueError(f"Unsupported mode {mode!r}, expected 'min' or 'max'")
+        self.dirpath = Path(dirpath)
+        self.save_top_k = save_top_k
+        self.save_last = save_last
+        self.monitor = monitor
+        self.mode = mode
+        self.is_main = is_main
+
+        # (score, path) of the kept checkpoints, best first
+        self.best: list[tuple[float, Path]] = []
+        self.saves = 0
+        self._buffers: dict[tuple, torch.Tensor] = {}
+        self._pending: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+        if is_main:
+            self._load_index()
+
+    def _load_index(self):
+        """Rebuild the ranking from a previous run's index, evicting beyond top-k."""
+        index_path = self.dirpath / self.INDEX
+        if not index_path.exists():
+            return
+        with open(index_path) as f:
+            index = json.load(f)
+        if (index.get("monitor"), index.get("mode")) != (self.monitor, self.mode):
+            logger.warning(
+                f"Checkpoints in {self.dirpath} were ranked by {index.get('monitor')} "
+                f"({index.get('mode')}), not restoring their ranking"
+            )
+            return
+        self.saves = index["saves"]
+        self.best = [
+            (score, self.dirpath / name)
+            for score, name in index["best"]
+            if (self.dirpath / name).exists()
+        ]
+        self.best.sort(key=lambda item: item[0])
+        if self.save_top_k >= 0:
+            for _, path in self.best[self.save_top_k :]:
+                path.unlink(missing_ok=True)
+            self.best = self.best[: self.save_top_k]
+        self._write_index(self._index())
+
+    def _index(self) -> dict[str, Any]:
+        return {
+            "monitor": self.monitor,
+            "mode": self.mode,
+            "saves": self.saves,
+            "best": [[score, path.name] for score, path in self.best],
+        }
+
+    def _write_index(self, index: dict[str, Any]):
+        tmp = self.dirpath / (self.INDEX + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.dirpath / self.INDEX)
+
+    def _score(self, metric: Optional[float]) -> float:
+        """Sort key, lower is better; without a metric newer checkpoints rank higher."""
+        if metric is None:
+            return -float(self.saves)
+        return metric if self.mode == "min" else -metric
+
+    def _snapshot(self, obj: Any, path: tuple = ()) -> Any:
+        """Copy ``obj`` with every tensor moved into a reusable CPU buffer."""
+        if isinstance(obj, torch.Tensor):
+            buf = self._buffers.get(path)
+            if buf is None or buf.shape != obj.shape or buf.dtype != obj.dtype:
+                buf = torch.empty(obj.shape, dtype=obj.dtype, pin_memory=obj.is_cuda)
+                self._buffers[path] = buf
+            buf.copy_(obj.detach(), non_blocking=obj.is_cuda)
+            return buf
+        if isinstance(obj, dict):
+            return type(obj)((k, self._snapshot(v, path + (k,))) for k, v in obj.items())
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self._snapshot(v, path + (i,)) for i, v in enumerate(obj))
+        return obj
+
+    def save(
+        self, state: dict, file_name: Optional[str] = None, metric: Optional[float] = None
+    ) -> bool:
+        """
+        Snapshot ``state`` and write it in the background.
+
+        Args:
+            state: Checkpoint content; tensors may live on any device
+            file_name: File name inside ``dirpath``; None writes only ``last.pt`` (even with
+                ``save_last=False``) and leaves the ranked checkpoints alone
+            metric: Value of the monitored metric, None to rank by recency
+
+        Returns:
+            Whether the checkpoint enters the top-k; always False off the main rank
+        """
+        if not self.is_main:
+            return False
+        self.wait()
+        score = self._score(metric)
+        self.saves += 1
+        path = self.dirpath / file_name if file_name is not None else None
+        keep = path is not None and (
+            self.save_top_k < 0
+            or (
+                self.save_top_k > 0
+                and (len(self.best) < self.save_top_k or score < self.best[-1][0])
+            )
+        )
+        if path is not None and not keep and not self.save_last:
+            return False
+
+        snapshot = self._snapshot(state)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+        evicted: list[Path] = []
+        if keep and path is not None:
+            self.best = [(s, p) for s, p in self.best if p != path]
+            self.best.append((score, path))
+            self.best.sort(key=lambda item: item[0])
+            if self.save_top_k >= 0:
+                evicted = [p for _, p in self.best[self.save_top_k :]]
+                self.best = self.best[: self.save_top_k]
+
+        self._pending = threading.Thread(
+            target=self._write,
+            args=(snapshot, path if keep else None, evicted, self._index()),
+            name="checkpoint-writer",
+            daemon=True,
+        )
+        self._pending.start()
+        return keep
+
+    def _write(
+        self, snapshot: dict, path: Optional[Path], evicted: list[Path], index: dict[str, Any]
+    ):
+        try:
+            self.dirpath.mkdir(parents=True, exist_ok=True)
+            target = path or self.dirpath / self.LAST
+            tmp = target.with_name(target.name + ".tmp")
+            torch.save(snapshot, tmp)
+            if path is not None and self.save_last:
+                # The same bytes under a second name, without writing them twice
+                last_tmp = self.dirpath / (self.LAST + ".tmp")
+                last_tmp.unlink(missing_ok=True)
+                try:
+                    os.link(tmp, last_tmp)
+                except OSError:
+                    torch.save(snapshot, last_tmp)
+                os.replace(last_tmp, self.dirpath / self.LAST)
+            os.replace(tmp, target)
+            for old in evicted:
+                old.unlink(missing_ok=True)
+            self._write_index(index)
+            logger.debug(f"Saved checkpoint to {target}")
+        except BaseException as e:
+            self._error = e
+
+    def wait(self):
+        """Block until the pending write has finished; re-raise its error, if any."""
+        if self._pending is not None:
+            self._pending.join()
+            self._pending = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing checkpoint failed") from error
+
+    @property
+    def best_path(self) -> Optional[Path]:
+        """Best checkpoint kept so far."""
+        return self.best[0][1] if self.best else None
@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+from torch import nn
+
+
+def enable_compile_cache(cache_dir: str):
+    """
+    Persist compiled kernels and graphs in ``cache_dir`` so restarts skip recompilation.
+
+    Must be called before the first compiled call.
+    """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(Path(cache_dir).resolve())
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+
+def compile_modules(
+    *modules: nn.Module,
+    backend: str = "inductor",
+    mode: Optional[str] = None,
+    dynamic: Optional[bool] = None,
+):
+    """
+    Compile modules in place with ``torch.compile``.
+
+    ``nn.Module.compile`` keeps the module object and its parameter names, so optimizers,
+    EMA copies and checkpoints are unaffected. Compilation happens lazily at the first
+    call, so run a warmup step before timing anything.
+
+    Args:
+        modules: Modules to compile
+        backend: torch.compile backend ("inductor" generates C++/OpenMP kernels on CPU)
+        mode: torch.compile mode, e.g. "max-autotune"; None for the default
+        dynamic: Compile for dynamic shapes; None lets torch decide after a recompile
+    """
+    for module in modules:
+        module.compile(backend=backend, mode=mode, dynamic=dynamic)
@@ -74,6 +74,20 @@ class MultiscaleDiscriminator(nn.Module):
 
         self.downsample = nn.AvgPool2d(3, stride=2, padding=[1, 1], count_include_pad=False)
 
+        # Layers of each scale in forward order, resolved once instead of by name on every
+        # call. A plain list is not registered, so parameter names are unchanged.
+        self.scales = []
+        for i in range(num_D):
+            if getIntermFeat:
+                self.scales.append(
+                    [
+                        getattr(self, "scale" + str(num_D - 1 - i) + "_layer" + str(j))
+                        for j in range(n_layers + 2)
+                    ]
+                )
+            else:
+                self.scales.append(getattr(self, "layer" + str(num_D - 1 - i)))
+
     def singleD_forward(self, model, input):
         if self.getIntermFeat:
             result = [input]
@@ -87,14 +101,7 @@ class MultiscaleDiscriminator(nn.Module):
         num_D = self.num_D
         result = []
         input_downsampled = input
-        for i in range(num_D):
-            if self.getIntermFeat:
-                model = [
-                    getattr(self, "scale" + str(num_D - 1 - i) + "_layer" + str(j))
-                    for j in range(self.n_layers + 2)
-                ]
-            else:
-                model = getattr(self, "layer" + str(num_D - 1 - i))
+        for i, model in enumerate(self.scales):
             result.append(self.singleD_forward(model, input_downsampled))
             if i != (num_D - 1):
                 input_downsampled = self.downsample(input_downsampled)
@@ -0,0 +1,100 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+import os
+from typing import Optional
+
+import torch
+import torch.distributed as dist
+
+
+class DistributedContext:
+    """Rank layout of the current process; a single process has rank 0 of world size 1."""
+
+    def __init__(
+        self, rank: int = 0, local_rank: int = 0, world_size: int = 1, local_world_size: int = 1
+    ):
+        self.rank = rank
+        self.local_rank = local_rank
+        self.world_size = world_size
+        self.local_world_size = local_world_size
+
+    @property
+    def enabled(self) -> bool:
+        return self.world_size > 1
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+
+def setup_distributed(backend: str = "gloo", threads_per_process: int = 0) -> DistributedContext:
+    """
+    Join the process group described by the torchrun environment variables.
+
+    Without ``WORLD_SIZE`` > 1 in the environment (plain ``python`` launch) nothing is
+    initialized. Each process gets an equal share of the host's cores for intra-op
+    parallelism, so ranks do not oversubscribe the CPU.
+
+    Args:
+        backend: torch.distributed backend; gloo works on CPU and across hosts
+        threads_per_process: Intra-op threads per rank (0 = cores / local ranks)
+
+    Returns:
+        Rank layout of this process
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size <= 1:
+        return DistributedContext()
+
+    ctx = DistributedContext(
+        rank=int(os.environ["RANK"]),
+        local_rank=int(os.environ.get("LOCAL_RANK", 0)),
+        world_size=world_size,
+        local_world_size=int(os.environ.get("LOCAL_WORLD_SIZE", world_size)),
+    )
+    if not dist.is_initialized():
+        dist.init_process_group(backend=backend)
+    threads = threads_per_process or max((os.cpu_count() or 1) // ctx.local_world_size, 1)
+    torch.set_num_threads(threads)
+    return ctx
+
+
+def cleanup_distributed():
+    if dist.is_available() and dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+@contextmanager
+def main_process_first(ctx: DistributedContext) -> Iterator[None]:
+    """Let rank 0 run the block first, e.g. to build caches the other ranks then read."""
+    if not ctx.is_main:
+        barrier()
+    yield
+    if ctx.is_main:
+        barrier()
+
+
+def all_reduce_mean(tensor: torch.Tensor) -> torch.Tensor:
+    """Average a tensor over all ranks in place; a no-op in a single process."""
+    if is_distributed():
+        dist.all_reduce(tensor)
+        tensor.div_(dist.get_world_size())
+    return tensor
+
+
+def any_rank(flag: bool, device: Optional[torch.device] = None) -> bool:
+    """Whether ``flag`` is set on any rank; every rank must call this together."""
+    if not is_distributed():
+        return flag
+    tensor = torch.tensor(int(flag), device=device)
+    dist.all_reduce(tensor, op=dist.ReduceOp.MAX)
+    return bool(tensor.item())
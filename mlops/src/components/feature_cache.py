@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from collections.abc import Callable
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+from loguru import logger
+import numpy as np
+import torch
+
+
+def write_json(path: Path, obj: Any):
+    """Write ``obj`` as JSON through a per-process temporary file and an atomic rename."""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+class VGGFeatureCache:
+    """
+    On-disk cache of VGG features of target images, read back through memory maps.
+
+    Each entry is one flat ``.npy`` file holding the five feature maps of one sample,
+    keyed by a stable sample identity, augmentation parameters and image size. Entries
+    are evicted in least-recently-used order once ``max_bytes`` is exceeded. Since the
+    VGG weights are frozen, features stay valid across runs and are reloaded from
+    ``cache_dir``; a cache written with other ``params`` is wiped on open.
+
+    Processes may share ``cache_dir``: files are replaced atomically and a file removed by
+    another process counts as a miss. Opening a cache that has to be wiped should still
+    happen on one process first (see ``main_process_first``).
+    """
+
+    SHAPES_FILE = "shapes.json"
+    PARAMS_FILE = "params.json"
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int,
+        dtype: str = "float16",
+        params: Optional[dict[str, Any]] = None,
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            cache_dir: Directory holding the cached features
+            max_bytes: Disk budget for cached features
+            dtype: Storage dtype; float16 halves disk use at a small precision cost
+            params: Settings the features depend on (e.g. VGG precision). Entries
+                written with different params (or dtype) are discarded.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.params = {**(params or {}), "dtype": self.dtype.name}
+        self.hits = 0
+        self.misses = 0
+
+        params_path = self.cache_dir / self.PARAMS_FILE
+        stored = None
+        if params_path.exists():
+            with open(params_path) as f:
+                stored = json.load(f)
+        if stored != self.params:
+            if stored is not None:
+                logger.info(f"VGG cache settings changed, clearing {self.cache_dir}")
+            for path in self.cache_dir.glob("*.npy"):
+                path.unlink(missing_ok=True)
+            (self.cache_dir / self.SHAPES_FILE).unlink(missing_ok=True)
+            write_json(params_path, self.params)
+
+        shapes_path = self.cache_dir / self.SHAPES_FILE
+        self.shapes: dict[str, list[list[int]]] = {}
+        if shapes_path.exists():
+            with open(shapes_path) as f:
+                self.shapes = json.load(f)
+
+        # Entries of a previous run start out in write order, oldest evicted first
+        stats = []
+        for path in self.cache_dir.glob("*.npy"):
+            try:
+                stats.append((path.stem, path.stat()))
+            except FileNotFoundError:
+                # Evicted by another process sharing the directory
+                continue
+        stats.sort(key=lambda item: item[1].st_mtime)
+        self.index: OrderedDict[str, int] = OrderedDict((k, st.st_size) for k, st in stats)
+        self.total_bytes = sum(self.index.values())
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npy"
+
+    def get(self, key: str, size_key: str) -> Optional[list[np.ndarray]]:
+        """Return memory-mapped feature maps for ``key``, or None on a miss."""
+        if key not in self.index or size_key not in self.shapes:
+            return None
+        try:
+            flat = np.load(self._path(key), mmap_mode="r")
+        except FileNotFoundError:
+            # Evicted by another process sharing the directory
+            self.total_bytes -= self.index.pop(key)
+            return None
+        self.index.move_to_end(key)
+        feats, offset = [], 0
+        for shape in self.shapes[size_key]:
+            n = int(np.prod(shape))
+            feats.append(flat[offset : offset + n].reshape(shape))
+            offset += n
+        return feats
+
+    def put(self, key: str, size_key: str, feats: list[torch.Tensor]):
+        """Store the feature maps of one sample, evicting old entries over budget."""
+        if size_key not in self.shapes:
+            self.shapes[size_key] = [list(f.shape) for f in feats]
+            write_json(self.cache_dir / self.SHAPES_FILE, self.shapes)
+        flat = torch.cat([f.detach().flatten() for f in feats]).cpu().numpy()
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, flat.astype(self.dtype, copy=False))
+        os.replace(tmp_path, path)
+
+        nbytes = path.stat().st_size
+        self.total_bytes += nbytes - self.index.pop(key, 0)
+        self.index[key] = nbytes
+        while self.total_bytes > self.max_bytes and len(self.index) > 1:
+            old_key, old_bytes = self.index.popitem(last=False)
+            self._path(old_key).unlink(missing_ok=True)
+            self.total_bytes -= old_bytes
+
+    def clear(self):
+        for key in self.index:
+            self._path(key).unlink(missing_ok=True)
+        self.index.clear()
+        self.total_bytes = 0
+
+    def features(
+        self,
+        vgg: Callable[[torch.Tensor], list[torch.Tensor]],
+        y: torch.Tensor,
+        keys: list[str],
+    ) -> list[torch.Tensor]:
+        """
+        Return the VGG features of ``y``, computing them only for uncached samples.
+
+        Args:
+            vgg: Feature extractor returning a list of feature maps
+            y: Batch of target images
+            keys: Cache key of every sample in ``y``
+
+        Returns:
+            Feature maps of the whole batch, one tensor per VGG slice
+        """
+        size_key = "x".join(str(d) for d in y.shape[1:])
+        keys = [f"{key}_{size_key}" for key in keys]
+        cached = [self.get(key, size_key) for key in keys]
+        missing = [i for i, c in enumerate(cached) if c is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            with torch.no_grad():
+                computed = vgg(y[missing])
+            for j, i in enumerate(missing):
+                self.put(keys[i], size_key, [f[j] for f in computed])
+
+        out = [
+            torch.empty((len(keys), *shape), device=y.device, dtype=y.dtype)
+            for shape in self.shapes[size_key]
+        ]
+        hits = [(i, c) for i, c in enumerate(cached) if c is not None]
+        hit = [i for i, _ in hits]
+        for level, feats in enumerate(out):
+            if hit:
+                stacked = np.stack([c[level] for _, c in hits]).astype(np.float32)
+                feats[hit] = torch.from_numpy(stacked).to(y.device, y.dtype)
+            if missing:
+                feats[missing] = computed[level].to(y.dtype)
+        return out
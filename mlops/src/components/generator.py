@@ -1,5 +1,6 @@
 import torch
 from torch import nn
+from torch.utils.checkpoint import checkpoint
 
 from mlops.src.components.functions import get_norm_layer, weights_init
 
@@ -15,13 +16,20 @@ def define_G(
     n_blocks_local=3,
     norm="instance",
     gpu_ids=None,
+    checkpointing="none",
 ):
     if gpu_ids is None:
         gpu_ids = []
     norm_layer = get_norm_layer(norm_type=norm)
     if netG == "global":
         netG = GlobalGenerator(
-            input_nc, output_nc, ngf, n_downsample_global, n_blocks_global, norm_layer
+            input_nc,
+            output_nc,
+            ngf,
+            n_downsample_global,
+            n_blocks_global,
+            norm_layer,
+            checkpointing=checkpointing,
         )
     else:
         raise Exception("generator not implemented!")
@@ -75,6 +83,9 @@ class ResnetBlock(nn.Module):
         return out
 
 
+CHECKPOINT_MODES = ("none", "trunk", "full")
+
+
 class GlobalGenerator(nn.Module):
     def __init__(
         self,
@@ -85,9 +96,24 @@ class GlobalGenerator(nn.Module):
         n_blocks=9,
         norm_layer=nn.BatchNorm2d,
         padding_type="reflect",
+        checkpointing="none",
     ):
+        """
+        Initialize generator.
+
+        Args:
+            checkpointing: Activation checkpointing while training: "none", "trunk" (each
+                resnet block) or "full" (resnet blocks and upsampling stages). Checkpointed
+                stages keep only their input for the backward pass and run their forward
+                again there, trading compute for activation memory.
+        """
         assert n_blocks >= 0
+        if checkpointing not in CHECKPOINT_MODES:
+            raise ValueError(
+                f"Unsupported checkpointing {checkpointing!r}, expected one of {CHECKPOINT_MODES}"
+            )
         super().__init__()
+        self.checkpointing = checkpointing
         activation = nn.ReLU(True)
 
         model = [
@@ -139,5 +165,23 @@ class GlobalGenerator(nn.Module):
         ]
         self.model = nn.Sequential(*model)
 
+        # Stages as (layers, checkpointed) over views of self.model, so parameter names
+        # and checkpoints are the same in every mode. A plain list is not registered
+        # as a submodule.
+        head = 4 + 3 * n_downsampling
+        bounds = [(0, head, False)]
+        bounds += [(head + i, head + i + 1, checkpointing != "none") for i in range(n_blocks)]
+        up = head + n_blocks
+        bounds += [
+            (up + 3 * i, up + 3 * (i + 1), checkpointing == "full") for i in range(n_downsampling)
+        ]
+        bounds += [(up + 3 * n_downsampling, len(self.model), False)]
+        self.stages = [(self.model[start:end], ckpt) for start, end, ckpt in bounds]
+
     def forward(self, input):
-        return self.model(input)
+        if self.checkpointing == "none" or not torch.is_grad_enabled():
+            return self.model(input)
+        x = input
+        for layers, ckpt in self.stages:
+            x = checkpoint(layers, x, use_reentrant=False) if ckpt else layers(x)
+        return x
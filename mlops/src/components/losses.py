@@ -1,7 +1,11 @@
+from typing import Optional
+
 import torch
 import torch.nn as nn
 from torchvision import models
 
+from mlops.src.components.feature_cache import VGGFeatureCache
+
 
 ##############################################################################
 # Losses
@@ -24,27 +28,77 @@ class GANLoss(nn.Module):
         return targets
 
     def __call__(self, input, target_is_real):
+        # The squared error is computed in fp32 even under autocast
         if isinstance(input[0], list):
             loss = 0
             for input_i in input:
-                pred = input_i[-1]
+                pred = input_i[-1].float()
                 target_tensor = self.get_target_tensor(pred, target_is_real)
-                loss += self.loss(pred, target_tensor)
+                with torch.autocast(pred.device.type, enabled=False):
+                    loss += self.loss(pred, target_tensor)
             return loss
         else:
-            target_tensor = self.get_target_tensor(input[-1], target_is_real)
-            return self.loss(input[-1], target_tensor)
+            pred = input[-1].float()
+            target_tensor = self.get_target_tensor(pred, target_is_real)
+            with torch.autocast(pred.device.type, enabled=False):
+                return self.loss(pred, target_tensor)
 
 
 class VGGLoss(nn.Module):
-    def __init__(self):
+    def __init__(
+        self,
+        feature_cache: Optional[VGGFeatureCache] = None,
+        fused: bool = False,
+        precision: str = "32",
+        channels_last: bool = False,
+        pretrained: bool = True,
+    ):
+        """
+        Initialize VGG perceptual loss.
+
+        Args:
+            feature_cache: Optional cache of target features, used when keys are given
+            fused: Run generated and target images through VGG as one concatenated batch
+            precision: "32" for fp32 or "bf16" for a bfloat16 autocast VGG forward;
+                features are cast back to fp32 for the L1 terms
+            channels_last: Run VGG in channels_last memory format, which lets CPU
+                convolutions use oneDNN without layout reorders
+            pretrained: Load ImageNet weights (disable for tests and benchmarks)
+        """
         super().__init__()
-        self.vgg = Vgg19()
+        if precision not in ("32", "bf16"):
+            raise ValueError(f"Unsupported VGG loss precision: {precision}")
+        self.vgg = Vgg19(pretrained=pretrained)
         self.criterion = nn.L1Loss()
         self.weights = [1.0 / 32, 1.0 / 16, 1.0 / 8, 1.0 / 4, 1.0]
+        self.feature_cache = feature_cache
+        self.fused = fused
+        self.precision = precision
+        self.channels_last = channels_last
+        if channels_last:
+            self.vgg.to(memory_format=torch.channels_last)
 
-    def forward(self, x, y):
-        x_vgg, y_vgg = self.vgg(x), self.vgg(y)
+    def features(self, x: torch.Tensor) -> list[torch.Tensor]:
+        """Run VGG in the configured memory format and precision."""
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        if self.precision == "bf16":
+            with torch.autocast(x.device.type, dtype=torch.bfloat16):
+                return [h.float() for h in self.vgg(x)]
+        features: list[torch.Tensor] = self.vgg(x)
+        return features
+
+    def forward(self, x, y, keys: Optional[list[str]] = None):
+        if self.feature_cache is not None and keys is not None:
+            # Only the features of the generated image are always computed
+            x_vgg = self.features(x)
+            y_vgg = self.feature_cache.features(self.features, y, keys)
+        elif self.fused:
+            feats = self.features(torch.cat([x, y.detach()]))
+            x_vgg = [h[: x.shape[0]] for h in feats]
+            y_vgg = [h[x.shape[0] :] for h in feats]
+        else:
+            x_vgg, y_vgg = self.features(x), self.features(y)
         loss = 0
         for i in range(len(x_vgg)):
             loss += self.weights[i] * self.criterion(x_vgg[i], y_vgg[i].detach())
@@ -52,9 +106,9 @@ class VGGLoss(nn.Module):
 
 
 class Vgg19(torch.nn.Module):
-    def __init__(self, requires_grad=False):
+    def __init__(self, requires_grad=False, pretrained=True):
         super().__init__()
-        vgg_pretrained_features = models.vgg19(pretrained=True).features
+        vgg_pretrained_features = models.vgg19(pretrained=pretrained).features
         self.slice1 = torch.nn.Sequential()
         self.slice2 = torch.nn.Sequential()
         self.slice3 = torch.nn.Sequential()
@@ -1,6 +1,88 @@
+from typing import Any
+
 import torch
+from torch import nn
 
 
 def moving_average(model, model_ema, beta=0.999):
     for param, param_ema in zip(model.parameters(), model_ema.parameters()):
         param_ema.data = torch.lerp(param.data, param_ema.data, beta)
+
+
+class ModelEMA:
+    """
+    Exponential moving average of a model's weights, updated in place.
+
+    All parameters are updated with one fused ``torch._foreach_lerp_`` call, so an update
+    costs a single pass over the weights with no temporaries. Updating only every
+    ``update_every`` optimizer steps uses ``decay ** update_every``, which keeps the same
+    averaging horizon in optimizer steps. During the first ``warmup_steps`` steps the
+    average simply tracks the weights, so it does not retain the random initialization.
+    Buffers are copied rather than averaged.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        ema_model: nn.Module,
+        decay: float = 0.9999,
+        update_every: int = 1,
+        warmup_steps: int = 0,
+    ):
+        """
+        Initialize EMA.
+
+        Args:
+            model: Model being trained
+            ema_model: Copy of ``model`` holding the averaged weights
+            decay: Per-step decay rate
+            update_every: Number of optimizer steps between updates
+            warmup_steps: Number of initial steps during which the weights are copied
+        """
+        self.decay = decay
+        self.update_every = max(update_every, 1)
+        self.warmup_steps = warmup_steps
+        self.params: list[torch.Tensor] = list(model.parameters())
+        self.ema_params: list[torch.Tensor] = list(ema_model.parameters())
+        self.buffers: list[torch.Tensor] = list(model.buffers())
+        self.ema_buffers: list[torch.Tensor] = list(ema_model.buffers())
+        self.steps = 0
+
+    def current_decay(self) -> float:
+        """Decay applied by the next update."""
+        if self.steps < self.warmup_steps:
+            return 0.0
+        return self.decay**self.update_every
+
+    @torch.no_grad()
+    def copy_weights(self):
+        """Set the averaged weights to the current weights."""
+        torch._foreach_copy_(self.ema_params, self.params)
+        if self.buffers:
+            torch._foreach_copy_(self.ema_buffers, self.buffers)
+
+    @torch.no_grad()
+    def step(self) -> bool:
+        """
+        Record one optimizer step and update the average when it is due.
+
+        Returns:
+            Whether the average was updated
+        """
+        decay = self.current_decay()
+        self.steps += 1
+        if decay > 0.0 and self.steps % self.update_every != 0:
+            return False
+        if decay == 0.0:
+            self.copy_weights()
+            return True
+        torch._foreach_lerp_(self.ema_params, self.params, 1.0 - decay)
+        if self.buffers:
+            torch._foreach_copy_(self.ema_buffers, self.buffers)
+        return True
+
+    def state_dict(self) -> dict[str, Any]:
+        return {"steps": self.steps}
+
+    def load_state_dict(self, state: dict[str, Any]):
+        self.steps = state["steps"]
@@ -0,0 +1,88 @@
+import os
+import queue
+import threading
+from typing import Optional
+
+import cv2
+from loguru import logger
+import numpy as np
+import torch
+
+
+def make_preview_grid(*columns: torch.Tensor) -> torch.Tensor:
+    """
+    Tile batches of images in [-1, 1] into one BGR uint8 image.
+
+    Each sample is a row and each batch a column, e.g. ``(data, fake, target)``.
+
+    Args:
+        columns: Batches of shape (B, 3, H, W) on any device
+
+    Returns:
+        Image of shape (B * H, len(columns) * W, 3), on the device of the inputs
+    """
+    pairs = torch.cat(columns, -1)
+    b, c, h, w = pairs.shape
+    grid = pairs.permute(0, 2, 3, 1).reshape(b * h, w, c)
+    # RGB -> BGR for cv2
+    grid = grid.flip(-1)
+    return ((grid + 1) * 127.5).clamp_(0, 255).to(torch.uint8)
+
+
+class PreviewWriter:
+    """
+    Encode and write preview images on a background thread.
+
+    Frames are queued as uint8 arrays; ``submit`` never waits for the disk. When the
+    queue is full the frame is dropped, so slow storage cannot stall training.
+    """
+
+    def __init__(self, out_dir: str, max_queue: int = 4):
+        self.out_dir = out_dir
+        self.dropped = 0
+        self._queue: queue.Queue[Optional[tuple[str, np.ndarray]]] = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, name="preview-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, image: torch.Tensor, file_name: str) -> bool:
+        """
+        Queue an image for writing.
+
+        Args:
+            image: (H, W, 3) BGR uint8 image, see :func:`make_preview_grid`
+            file_name: Name of the file inside ``out_dir``; the extension picks the codec
+
+        Returns:
+            Whether the image was queued (False if the queue was full)
+        """
+        try:
+            self._queue.put_nowait((file_name, image.cpu().numpy()))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Preview writer is behind, dropped {file_name}")
+            return False
+        return True
+
+    def _run(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                file_name, image = item
+                cv2.imwrite(os.path.join(self.out_dir, file_name), image)
+            except Exception as e:
+                logger.error(f"Failed to write preview: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued image is written."""
+        self._queue.join()
+
+    def close(self):
+        """Write the remaining images and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
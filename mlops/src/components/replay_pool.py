@@ -15,10 +15,18 @@ class ReplayPool:
         self.poolSize = pool_size
         self.data = []
 
-    def query(self, fake_data):
+    def query(self, fake_data, update=True):
+        """
+        Return a batch mixing ``fake_data`` with stored samples.
+
+        With ``update=False`` the pool is only read: stored samples are drawn but not
+        replaced and ``fake_data`` is not inserted (see :meth:`add`).
+        """
         assert isinstance(fake_data, dict)
         if self.poolSize == 0:  # if the buffer size is 0, do nothing
             return fake_data
+        if not update:
+            return self._sample(fake_data)
         result = []
         batch_size = None
         for k in fake_data:
@@ -50,3 +58,65 @@ class ReplayPool:
                 list.append(rec[k])
             result_[k] = torch.stack(list, 0)
         return result_
+
+    def _sample(self, fake_data):
+        batch_size = next(iter(fake_data.values())).shape[0]
+        if len(self.data) < self.poolSize:
+            return fake_data
+        result_ = {k: v.clone() for k, v in fake_data.items()}
+        for idx in range(batch_size):
+            if random.random() < 0.5:
+                continue
+            random_rec = self.data[random.randint(0, len(self.data) - 1)]
+            for k in result_:
+                result_[k][idx] = random_rec[k]
+        return result_
+
+    def add(self, fake_data):
+        """Insert a batch with the same replacement rule as :meth:`query`."""
+        if self.poolSize == 0:
+            return
+        batch_size = next(iter(fake_data.values())).shape[0]
+        for idx in range(batch_size):
+            rec = {k: v[idx] for k, v in fake_data.items()}
+            if len(self.data) < self.poolSize:
+                self.data.append(rec)
+            elif random.random() >= 0.5:
+                self.data[random.randint(0, len(self.data) - 1)] = rec
+
+    def state_dict(self, quantize=False):
+        """
+        Stored samples, for checkpointing.
+
+        With ``quantize`` the samples are stacked into one uint8 tensor per key, assuming
+        values in [-1, 1] like normalized images and generator outputs: a quarter of the
+        fp32 size, at a rounding error of at most 1/255.
+        """
+        if not quantize or not self.data:
+            return {"pool_size": self.poolSize, "data": list(self.data)}
+        data = {}
+        for k, first in self.data[0].items():
+            # Filled record by record, so no full-precision copy of the pool is made
+            stacked = torch.empty(
+                (len(self.data), *first.shape), dtype=torch.uint8, device=first.device
+            )
+            for idx, rec in enumerate(self.data):
+                stacked[idx] = ((rec[k].float() + 1) * 127.5).round_().clamp_(0, 255)
+            data[k] = stacked
+        dtypes = {k: str(v.dtype).removeprefix("torch.") for k, v in self.data[0].items()}
+        return {"pool_size": self.poolSize, "data": data, "dtypes": dtypes}
+
+    def load_state_dict(self, state):
+        data = state["data"]
+        if isinstance(data, dict):
+            # Quantized, see state_dict
+            dtypes = state["dtypes"]
+            size = len(next(iter(data.values()))) if data else 0
+            data = [
+                {
+                    k: (v[idx].float() / 127.5 - 1).to(getattr(torch, dtypes[k]))
+                    for k, v in data.items()
+                }
+                for idx in range(size)
+            ]
+        self.data = [dict(rec) for rec in data][: self.poolSize]
@@ -0,0 +1,133 @@
+import math
+from typing import Optional
+
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+
+def normalize_batch(x: torch.Tensor) -> torch.Tensor:
+    """Map a uint8 image batch to float in [-1, 1]; float batches are returned unchanged."""
+    if x.dtype == torch.uint8:
+        return x.float().div_(127.5).sub_(1.0)
+    return x
+
+
+class BatchAugment(nn.Module):
+    """
+    Paired augmentation applied once per collated batch as vectorized tensor ops.
+
+    Runs wherever the batch lives (main process or training device), so DataLoader
+    workers only have to return raw uint8 images. Every random parameter is drawn once
+    per sample and applied identically to the input and the target: flip and rotation
+    are folded into one affine matrix per sample and applied with a single
+    ``grid_sample`` over the stacked pair, and brightness/contrast are applied as one
+    fused color operation.
+    """
+
+    def __init__(
+        self,
+        horizontal_flip: float = 0.5,
+        rotation: float = 0.0,
+        brightness: float = 0.0,
+        contrast: float = 0.0,
+    ):
+        """
+        Initialize augmentation.
+
+        Args:
+            horizontal_flip: Probability of flipping a pair horizontally
+            rotation: Maximum absolute rotation in degrees
+            brightness: Brightness factor is drawn from [1 - brightness, 1 + brightness]
+            contrast: Contrast factor is drawn from [1 - contrast, 1 + contrast]
+        """
+        super().__init__()
+        self.horizontal_flip = horizontal_flip
+        self.rotation = rotation
+        self.brightness = brightness
+        self.contrast = contrast
+        # Flip mask of the last batch, used to key cached target features
+        self.last_flip: Optional[torch.Tensor] = None
+
+    @classmethod
+    def from_config(cls, cfg) -> "BatchAugment":
+        """Build from the ``dataset.augmentation`` config block."""
+        if not cfg.enable:
+            return cls(horizontal_flip=0.0)
+        return cls(
+            horizontal_flip=cfg.get("horizontal_flip", 0.0),
+            rotation=cfg.get("rotation", 0.0),
+            brightness=cfg.get("brightness", 0.0),
+            contrast=cfg.get("contrast", 0.0),
+        )
+
+    @property
+    def cacheable(self) -> bool:
+        """Whether an augmented target is fully determined by its sample and flip."""
+        return self.rotation <= 0 and self.brightness <= 0 and self.contrast <= 0
+
+    def cache_keys(self, sample_keys: list[str]) -> Optional[list[str]]:
+        """
+        Keys identifying the augmented targets of the last batch.
+
+        Args:
+            sample_keys: Stable keys of the samples in the last batch, see
+                ``Pix2PixHDDataset.sample_key``
+
+        Returns:
+            One ``"<sample key>-<flip>"`` key per sample, or None when continuous random
+            parameters make the targets unrepeatable
+        """
+        if not self.cacheable:
+            return None
+        flip = self.last_flip if self.last_flip is not None else torch.zeros(len(sample_keys))
+        return [f"{key}-{int(f)}" for key, f in zip(sample_keys, flip.tolist())]
+
+    def _uniform(self, n: int, spread: float, device: torch.device) -> torch.Tensor:
+        return 1.0 + (torch.rand(n, device=device) * 2 - 1) * spread
+
+    def _geometry(self, pair: torch.Tensor) -> torch.Tensor:
+        b = pair.shape[0]
+        flip = torch.rand(b, device=pair.device) < self.horizontal_flip
+        self.last_flip = flip
+        if self.rotation <= 0:
+            # Flip only: a plain index reversal is exact and cheaper than resampling
+            return torch.where(flip.view(-1, 1, 1, 1), pair.flip(-1), pair)
+
+        angle = (torch.rand(b, device=pair.device) * 2 - 1) * math.radians(self.rotation)
+        sign = 1.0 - 2.0 * flip.to(pair.dtype)
+        cos, sin = torch.cos(angle), torch.sin(angle)
+        zero = torch.zeros_like(cos)
+        # Rotation composed with an optional mirror of the x axis
+        theta = torch.stack(
+            [torch.stack([cos * sign, -sin, zero], -1), torch.stack([sin * sign, cos, zero], -1)],
+            1,
+        )
+        grid = F.affine_grid(theta, list(pair.shape), align_corners=False)
+        return F.grid_sample(
+            pair, grid, mode="bilinear", padding_mode="reflection", align_corners=False
+        )
+
+    def _color(self, pair: torch.Tensor) -> torch.Tensor:
+        b = pair.shape[0]
+        images = pair.view(b, 2, -1, *pair.shape[2:]).add(1.0).mul_(0.5)
+        bright = self._uniform(b, self.brightness, pair.device).view(-1, 1, 1, 1, 1)
+        contrast = self._uniform(b, self.contrast, pair.device).view(-1, 1, 1, 1, 1)
+        mean = images.mean(dim=(2, 3, 4), keepdim=True)
+        images = ((images - mean) * contrast + mean) * bright
+        return images.clamp_(0.0, 1.0).mul_(2.0).sub_(1.0).view_as(pair)
+
+    def forward(self, src: torch.Tensor, dst: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        src, dst = normalize_batch(src), normalize_batch(dst)
+        self.last_flip = None
+        geometry = self.horizontal_flip > 0 or self.rotation > 0
+        color = self.brightness > 0 or self.contrast > 0
+        if not (geometry or color):
+            return src, dst
+        channels = src.shape[1]
+        pair = torch.cat([src, dst], 1)
+        if geometry:
+            pair = self._geometry(pair)
+        if color:
+            pair = self._color(pair)
+        return pair[:, :channels], pair[:, channels:]
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+class Edges2ShoesDataset(Pix2PixHDDataset):
+    """
+    Dataset reading edges2shoes side-by-side A|B images in place.
+
+    Each file holds the edge map on the left and the photo on the right. The combined
+    image is decoded and color-converted once, then split into two views of the same
+    buffer, so no copy or separate preprocessing stage is needed. With the native
+    256x512 files and ``img_size=256`` no resize happens either.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        split: str = "train",
+        img_size: int = 256,
+        batch_augment: bool = False,
+        cache_bytes: int = 0,
+        return_key: bool = False,
+    ):
+        """
+        Initialize dataset.
+
+        Args:
+            root_dir: edges2shoes root containing ``train/`` and ``val/`` (e.g. the
+                kagglehub cache directory)
+            split: Subfolder to read
+            img_size: Size to resize each half to
+            batch_augment: Return raw uint8 CHW tensors for a batched augmentation stage
+            cache_bytes: Budget for a shared-memory cache of decoded pairs (0 disables it)
+            return_key: Also return the stable sample key
+        """
+        super().__init__(
+            images_dir=root_dir,
+            feature_fold=split,
+            label_fold=split,
+            img_size=img_size,
+            batch_augment=batch_augment,
+            cache_bytes=cache_bytes,
+            return_key=return_key,
+        )
+
+    def target_file(self, idx: int) -> str:
+        """The photo is the right half of the combined file."""
+        return self.images[idx]
+
+    def load_pair(self, idx: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the resized RGB uint8 (edges, photo) halves of a combined image."""
+        f_name = self.images[idx]
+        combined = cv2.imread(f_name, 1)
+        if combined is None:
+            raise FileNotFoundError(f"Could not read image {f_name}")
+        combined = cv2.cvtColor(combined, cv2.COLOR_BGR2RGB)
+
+        half = combined.shape[1] // 2
+        src, dst = combined[:, :half], combined[:, half : 2 * half]
+        if src.shape[:2] != (self.img_size, self.img_size):
+            src = cv2.resize(src, (self.img_size, self.img_size))
+            dst = cv2.resize(dst, (self.img_size, self.img_size))
+        return src, dst
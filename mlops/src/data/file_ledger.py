@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+from loguru import logger
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1(usedforsecurity=False)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path: str) -> dict[str, Any]:
+    """Return the mtime, size and content hash of a file."""
+    st = os.stat(path)
+    return {"mtime": st.st_mtime, "size": st.st_size, "sha1": file_digest(path)}
+
+
+class FileLedger:
+    """
+    Persistent record of file fingerprints, used to skip work on unchanged inputs.
+
+    A file is considered unchanged when its mtime and size match the recorded ones. If
+    only the mtime moved (e.g. the file was touched or re-copied), the content hash is
+    compared before giving up on the entry. Entries may carry extra fields describing
+    the result of the work done on the file.
+    """
+
+    def __init__(self, path: str, params: Optional[dict[str, Any]] = None):
+        """
+        Initialize ledger.
+
+        Args:
+            path: JSON file the ledger is persisted to
+            params: Settings the recorded work depends on. A ledger written with
+                different params is discarded, since none of its results apply.
+        """
+        self.path = Path(path)
+        self.params = params or {}
+        self.entries: dict[str, dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("params") == self.params:
+                self.entries = data.get("entries", {})
+            else:
+                logger.info(f"Settings changed since {self.path} was written, starting afresh")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, file_path: str) -> Optional[dict[str, Any]]:
+        """Return the entry for ``file_path`` if the file is unchanged since it was recorded."""
+        entry = self.entries.get(str(file_path))
+        if entry is None:
+            return None
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        if entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+            return entry
+        if entry["size"] == st.st_size and entry["sha1"] == file_digest(file_path):
+            entry["mtime"] = st.st_mtime
+            return entry
+        return None
+
+    def is_current(self, file_path: str) -> bool:
+        return self.get(file_path) is not None
+
+    def record(self, file_path: str, fp: Optional[dict[str, Any]] = None, **extra: Any):
+        """
+        Record a file as processed.
+
+        Args:
+            file_path: File that was processed
+            fp: Precomputed :func:`fingerprint`, e.g. from a worker process
+            extra: Additional fields to store with the entry
+        """
+        self.entries[str(file_path)] = {**(fp or fingerprint(file_path)), **extra}
+
+    def prune(self, keep: set[str]) -> list[str]:
+        """Drop entries of files not in ``keep`` (e.g. deleted inputs); returns them."""
+        removed = [path for path in self.entries if path not in keep]
+        for path in removed:
+            del self.entries[path]
+        return removed
+
+    def clear(self):
+        self.entries = {}
+
+    def save(self):
+        """Write the ledger atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"params": self.params, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,220 @@
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+from PIL import Image
+
+MANIFEST_VERSION = 1
+ENTRY_KEYS = ("sketch", "photo", "sketch_size", "photo_size", "sketch_mtime", "photo_mtime")
+
+
+def _image_info(path: str) -> tuple[list[int], float]:
+    """Read image dimensions from the file header only, plus its mtime."""
+    with Image.open(path) as img:
+        size = list(img.size)
+    return size, os.stat(path).st_mtime
+
+
+class PairManifest:
+    """
+    Resolved (sketch, photo) pairs with image sizes and mtimes, persisted as JSON.
+
+    Paths are stored relative to the images root so the dataset folder can be moved
+    without invalidating the manifest.
+    """
+
+    def __init__(self, root: str, feature_fold: str, label_fold: str, entries: list[dict]):
+        self.root = root
+        self.feature_fold = feature_fold
+        self.label_fold = label_fold
+        self.entries = entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def paths(self) -> tuple[list[str], list[str]]:
+        """Return absolute (sketch paths, photo paths) in manifest order."""
+        sketches = [os.path.join(self.root, e["sketch"]) for e in self.entries]
+        photos = [os.path.join(self.root, e["photo"]) for e in self.entries]
+        return sketches, photos
+
+    @classmethod
+    def build(
+        cls,
+        root: str,
+        feature_fold: str,
+        label_fold: str,
+        target_path: Callable[[str], str],
+        previous: Optional["PairManifest"] = None,
+    ) -> "PairManifest":
+        """
+        Scan the input folder and resolve every pair.
+
+        Args:
+            root: Root directory containing images
+            feature_fold: Subfolder for input images
+            label_fold: Subfolder for target images
+            target_path: Maps an input image path to its target image path
+            previous: Existing manifest whose entries are reused when both files are
+                unchanged, so only new or modified pairs have their headers read
+
+        Returns:
+            The new manifest
+        """
+        known = {}
+        if previous is not None:
+            known = {e["sketch"]: e for e in previous.entries}
+
+        sketches = sorted(Path(root, feature_fold).glob("*.jpg"))
+        todo = []
+        entries: list[Optional[dict]] = []
+        missing = 0
+        for sketch in sketches:
+            photo = target_path(str(sketch))
+            if not os.path.exists(photo):
+                logger.warning(f"Target image not found for input: {sketch.name}")
+                missing += 1
+                continue
+            rel_sketch = os.path.relpath(sketch, root)
+            entry = known.get(rel_sketch)
+            if (
+                entry is not None
+                and entry["sketch_mtime"] == os.stat(sketch).st_mtime
+                and entry["photo_mtime"] == os.stat(photo).st_mtime
+            ):
+                entries.append(entry)
+                continue
+            todo.append((len(entries), str(sketch), photo))
+            entries.append(None)
+
+        with ThreadPoolExecutor() as pool:
+            sketch_info = pool.map(_image_info, [t[1] for t in todo])
+            photo_info = pool.map(_image_info, [t[2] for t in todo])
+            for (pos, sketch_file, photo_file), s_info, p_info in zip(
+                todo, sketch_info, photo_info
+            ):
+                entries[pos] = {
+                    "sketch": os.path.relpath(sketch_file, root),
+                    "photo": os.path.relpath(photo_file, root),
+                    "sketch_size": s_info[0],
+                    "photo_size": p_info[0],
+                    "sketch_mtime": s_info[1],
+                    "photo_mtime": p_info[1],
+                }
+
+        logger.info(
+            f"Manifest: {len(entries)} pairs ({len(todo)} scanned, {missing} missing targets)"
+        )
+        return cls(str(root), feature_fold, label_fold, [e for e in entries if e is not None])
+
+    def is_current(self) -> bool:
+        """Whether every listed file still exists with its recorded mtime."""
+        for entry in self.entries:
+            for key in ("sketch", "photo"):
+                try:
+                    mtime = os.stat(os.path.join(self.root, entry[key])).st_mtime
+                except FileNotFoundError:
+                    return False
+                if mtime != entry[f"{key}_mtime"]:
+                    return False
+        return True
+
+    @classmethod
+    def load(cls, path: str, root: str, feature_fold: str, label_fold: str) -> "PairManifest":
+        """
+        Load and validate a manifest written by :meth:`save`.
+
+        Args:
+            path: Manifest file
+            root: Root directory the manifest is expected to describe
+            feature_fold: Expected input subfolder
+            label_fold: Expected target subfolder
+
+        Returns:
+            The loaded manifest
+
+        Raises:
+            ValueError: If the manifest is malformed or belongs to other folders
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version in {path}")
+        if data.get("feature_fold") != feature_fold or data.get("label_fold") != label_fold:
+            raise ValueError(
+                f"Manifest {path} was built for {data.get('feature_fold')} -> "
+                f"{data.get('label_fold')}, not {feature_fold} -> {label_fold}"
+            )
+        entries = data.get("pairs")
+        if not isinstance(entries, list) or len(entries) != data.get("count"):
+            raise ValueError(f"Manifest {path} is truncated")
+        for entry in entries:
+            if any(k not in entry for k in ENTRY_KEYS):
+                raise ValueError(f"Manifest {path} has a malformed entry: {entry}")
+
+        return cls(str(root), feature_fold, label_fold, entries)
+
+    def save(self, path: str):
+        """Write the manifest atomically."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "feature_fold": self.feature_fold,
+                    "label_fold": self.label_fold,
+                    "count": len(self.entries),
+                    "pairs": self.entries,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        path: str,
+        root: str,
+        feature_fold: str,
+        label_fold: str,
+        target_path: Callable[[str], str],
+        refresh: bool = False,
+    ) -> "PairManifest":
+        """
+        Load the manifest at ``path``, building it on first use.
+
+        Every listed file is checked against its recorded mtime; if one was removed or
+        modified the input folder is rescanned, reusing the entries of unchanged pairs.
+
+        Args:
+            path: Manifest file
+            root: Root directory containing images
+            feature_fold: Subfolder for input images
+            label_fold: Subfolder for target images
+            target_path: Maps an input image path to its target image path
+            refresh: Rescan the input folder even if no listed file changed, to pick up
+                new pairs
+
+        Returns:
+            The manifest
+        """
+        previous = None
+        if os.path.exists(path):
+            try:
+                previous = cls.load(path, root, feature_fold, label_fold)
+            except ValueError as e:
+                logger.warning(f"Rebuilding pair manifest: {e}")
+            else:
+                if not refresh:
+                    if previous.is_current():
+                        return previous
+                    logger.info(f"Pair manifest {path} lists changed or removed files, rescanning")
+
+        manifest = cls.build(root, feature_fold, label_fold, target_path, previous=previous)
+        manifest.save(path)
+        return manifest
@@ -0,0 +1,24 @@
+from pathlib import Path
+from typing import Optional
+
+
+def level_dir(pyramid_dir: str, size: int) -> Path:
+    """Directory holding the copies of every pair pre-resized to ``size``."""
+    return Path(pyramid_dir) / str(size)
+
+
+def select_level(pyramid_dir: str, size: int) -> Optional[Path]:
+    """
+    Pick the pyramid level to read ``size`` pixel images from.
+
+    The exact level is preferred; otherwise the smallest larger level is used so that
+    images are only ever downscaled. Returns None when no level is large enough.
+    """
+    root = Path(pyramid_dir)
+    if not root.is_dir():
+        return None
+    sizes = sorted(int(p.name) for p in root.iterdir() if p.is_dir() and p.name.isdigit())
+    for level in sizes:
+        if level >= size:
+            return level_dir(pyramid_dir, level)
+    return None
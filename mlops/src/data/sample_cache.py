@@ -0,0 +1,78 @@
+import multiprocessing as mp
+from typing import Optional
+
+import numpy as np
+import torch
+
+
+class SharedSampleCache:
+    """
+    Cache of decoded, resized pairs in shared memory, visible to every DataLoader worker.
+
+    The budget is split into fixed-size slots allocated up front with
+    ``share_memory_()``, so workers started after construction (fork or spawn) all
+    read and fill the same memory instead of holding private copies. When every slot
+    is taken, a slot is reclaimed with the CLOCK algorithm: recently hit slots get a
+    second chance, so the hot set stays resident. A dataset that fits the budget stays
+    fully resident after the first epoch.
+
+    Must be created in the main process before the DataLoader starts its workers.
+    """
+
+    def __init__(self, num_samples: int, img_size: int, max_bytes: int, channels: int = 3):
+        """
+        Initialize cache.
+
+        Args:
+            num_samples: Number of samples in the dataset (keys are 0..num_samples-1)
+            img_size: Side length of the cached images
+            max_bytes: Memory budget for the cached pixels
+            channels: Channels per image
+        """
+        self.shape = (img_size, img_size, channels)
+        slot_bytes = 2 * int(np.prod(self.shape))
+        self.num_slots = min(num_samples, max_bytes // slot_bytes)
+        if self.num_slots <= 0:
+            raise ValueError(f"Cache budget of {max_bytes} bytes cannot hold a single pair")
+
+        self.data = torch.zeros((self.num_slots, 2, *self.shape), dtype=torch.uint8)
+        self.slot_of = torch.full((num_samples,), -1, dtype=torch.int64)
+        self.owner = torch.full((self.num_slots,), -1, dtype=torch.int64)
+        self.referenced = torch.zeros(self.num_slots, dtype=torch.bool)
+        self.hand = torch.zeros(1, dtype=torch.int64)
+        for t in (self.data, self.slot_of, self.owner, self.referenced, self.hand):
+            t.share_memory_()
+        self.lock = mp.Lock()
+
+    def __len__(self) -> int:
+        return int((self.owner >= 0).sum())
+
+    def get(self, idx: int) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """Return a copy of the cached pair for ``idx``, or None on a miss."""
+        if int(self.slot_of[idx]) < 0:
+            return None
+        with self.lock:
+            slot = int(self.slot_of[idx])
+            if slot < 0 or int(self.owner[slot]) != idx:
+                return None
+            pair = self.data[slot].numpy().copy()
+            self.referenced[slot] = True
+        return pair[0], pair[1]
+
+    def put(self, idx: int, src: np.ndarray, dst: np.ndarray):
+        """Insert a pair, evicting a slot that has not been used since the last sweep."""
+        with self.lock:
+            if int(self.slot_of[idx]) >= 0:
+                return
+            hand = int(self.hand)
+            while bool(self.referenced[hand]):
+                self.referenced[hand] = False
+                hand = (hand + 1) % self.num_slots
+            evicted = int(self.owner[hand])
+            if evicted >= 0:
+                self.slot_of[evicted] = -1
+            self.data[hand, 0] = torch.from_numpy(np.ascontiguousarray(src))
+            self.data[hand, 1] = torch.from_numpy(np.ascontiguousarray(dst))
+            self.owner[hand] = idx
+            self.slot_of[idx] = hand
+            self.hand[0] = (hand + 1) % self.num_slots
@@ -0,0 +1,81 @@
+from collections.abc import Iterator, Sized
+import math
+from typing import Any
+
+import torch
+from torch.utils.data import Sampler
+
+
+class ResumableSampler(Sampler[int]):
+    """
+    Seeded shuffling sampler that can resume in the middle of an epoch.
+
+    The permutation of an epoch is derived from ``seed + epoch`` alone, so the order is
+    reproducible across restarts. The training loop reports consumed samples with
+    :meth:`advance`; after :meth:`load_state_dict` iteration starts at the first unseen
+    sample, so skipped samples are never read or decoded.
+
+    For distributed training every rank draws the same permutation and takes every
+    ``num_replicas``-th sample from ``rank`` on, padded by wrapping around so all ranks
+    get the same number of samples. ``offset`` then counts samples of this rank.
+    """
+
+    def __init__(self, data_source: Sized, seed: int = 0, num_replicas: int = 1, rank: int = 0):
+        """
+        Initialize sampler.
+
+        Args:
+            data_source: Dataset to sample from
+            seed: Base seed of the per-epoch permutations
+            num_replicas: Number of distributed ranks sharing the dataset
+            rank: Rank of this process
+        """
+        self.num_samples = len(data_source)
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.samples_per_replica = math.ceil(self.num_samples / num_replicas)
+        self.epoch = 0
+        self.offset = 0
+
+    def permutation(self) -> torch.Tensor:
+        """Return the sample order of this rank in the current epoch."""
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        order = torch.randperm(self.num_samples, generator=generator)
+        if self.num_replicas == 1:
+            return order
+        total = self.samples_per_replica * self.num_replicas
+        order = order.repeat(math.ceil(total / max(self.num_samples, 1)))[:total]
+        return order[self.rank :: self.num_replicas]
+
+    def __iter__(self) -> Iterator[int]:
+        yield from self.permutation()[self.offset :].tolist()
+
+    def __len__(self) -> int:
+        return max(self.samples_per_replica - self.offset, 0)
+
+    def set_epoch(self, epoch: int):
+        """Move to ``epoch``; the position is kept when resuming into the same epoch."""
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self.offset = 0
+
+    def advance(self, n: int):
+        """Mark ``n`` more samples of the current epoch as consumed."""
+        self.offset += n
+
+    def state_dict(self) -> dict[str, Any]:
+        return {
+            "epoch": self.epoch,
+            "offset": self.offset,
+            "seed": self.seed,
+            "num_replicas": self.num_replicas,
+        }
+
+    def load_state_dict(self, state: dict[str, Any]):
+        self.epoch = state["epoch"]
+        self.seed = state["seed"]
+        # Resuming with a different number of ranks keeps the number of consumed samples
+        consumed = state["offset"] * state.get("num_replicas", 1)
+        self.offset = consumed // self.num_replicas
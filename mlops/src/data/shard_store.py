@@ -0,0 +1,113 @@
+from collections.abc import Iterable
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+INDEX_FILE = "index.json"
+DATA_FILE = "pairs.u8"
+SHARD_VERSION = 1
+
+
+def write_shards(
+    out_dir: str,
+    names: list[str],
+    pairs: Iterable[tuple[np.ndarray, np.ndarray]],
+    img_size: int,
+) -> Path:
+    """
+    Pack decoded (sketch, photo) pairs into a contiguous uint8 memory-mapped array.
+
+    The array has shape ``(N, 2, img_size, img_size, 3)`` in RGB order and sits next to
+    an ``index.json`` describing it. Both files are written under temporary names and
+    renamed into place once complete, so a crashed pack never leaves a half-written store.
+
+    Args:
+        out_dir: Directory to write the store into
+        names: Source file name of every pair, in the same order as ``pairs``
+        pairs: Iterable of already resized ``(src, dst)`` RGB uint8 arrays
+        img_size: Side length every pair was resized to
+
+    Returns:
+        Path of the written store
+    """
+    if not names:
+        raise ValueError("Cannot pack an empty dataset")
+    out_path = Path(out_dir)
+    out_path.mkdir(parents=True, exist_ok=True)
+    shape = (len(names), 2, img_size, img_size, 3)
+
+    tmp_data = out_path / (DATA_FILE + ".tmp")
+    array = np.memmap(tmp_data, dtype=np.uint8, mode="w+", shape=shape)
+    count = 0
+    for idx, (src, dst) in enumerate(pairs):
+        if src.shape != shape[2:] or dst.shape != shape[2:]:
+            raise ValueError(
+                f"Pair {names[idx]} has shape {src.shape}/{dst.shape}, expected {shape[2:]}"
+            )
+        array[idx, 0] = src
+        array[idx, 1] = dst
+        count += 1
+    if count != len(names):
+        raise ValueError(f"Expected {len(names)} pairs, got {count}")
+    array.flush()
+    del array
+
+    tmp_index = out_path / (INDEX_FILE + ".tmp")
+    with open(tmp_index, "w") as f:
+        json.dump(
+            {
+                "version": SHARD_VERSION,
+                "image_size": img_size,
+                "count": len(names),
+                "names": names,
+            },
+            f,
+        )
+    os.replace(tmp_data, out_path / DATA_FILE)
+    os.replace(tmp_index, out_path / INDEX_FILE)
+    return out_path
+
+
+class ShardStore:
+    """
+    Read-only view over a pair store written by :func:`write_shards`.
+
+    The memory map is opened lazily so that the store can be pickled into DataLoader
+    workers cheaply; every worker maps the same file and shares the page cache. It is
+    mapped copy-on-write so samples can be handed to ``torch.from_numpy`` without a copy,
+    while the file itself is never modified.
+    """
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / INDEX_FILE) as f:
+            index = json.load(f)
+        if index.get("version") != SHARD_VERSION:
+            raise ValueError(f"Unsupported shard store version in {self.shard_dir}")
+        self.image_size: int = index["image_size"]
+        self.names: list[str] = index["names"]
+        self._array: Optional[np.memmap] = None
+
+    @property
+    def array(self) -> np.memmap:
+        if self._array is None:
+            shape = (len(self.names), 2, self.image_size, self.image_size, 3)
+            self._array = np.memmap(
+                self.shard_dir / DATA_FILE, dtype=np.uint8, mode="c", shape=shape
+            )
+        return self._array
+
+    def __getitem__(self, idx: int) -> tuple[np.ndarray, np.ndarray]:
+        pair = self.array[idx]
+        return pair[0], pair[1]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_array"] = None
+        return state
@@ -1,23 +1,63 @@
-import datetime
+from contextlib import nullcontext
 from glob import glob
+import hashlib
 import os
 from random import random
-from typing import Optional
+from typing import Any, Optional
 
 import cv2
 import numpy as np
 import pytorch_lightning as pl
 import torch
 from torch import nn
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import DataLoader
 from torchvision import transforms
 from tqdm import tqdm
 
+from mlops.src.components.checkpoint import CheckpointManager, rng_state, seed_rng, set_rng_state
+from mlops.src.components.distributed import all_reduce_mean, any_rank, is_distributed
+from mlops.src.components.moving_average import ModelEMA
+from mlops.src.components.preview import PreviewWriter, make_preview_grid
+from mlops.src.data.augmentation import BatchAugment, normalize_batch
+from mlops.src.data.manifest import PairManifest
+from mlops.src.data.pyramid import select_level
+from mlops.src.data.sample_cache import SharedSampleCache
+from mlops.src.data.sampler import ResumableSampler
+from mlops.src.data.shard_store import ShardStore
+
+AUTOCAST_DTYPES: dict[str, Optional[torch.dtype]] = {
+    "32": None,
+    "bf16": torch.bfloat16,
+    "16": torch.float16,
+}
+
+
+def split_predictions(pred: list, n: int) -> tuple[list, list]:
+    """Split multiscale discriminator outputs of a concatenated batch at sample ``n``."""
+    first = [[t[:n] for t in scale] for scale in pred]
+    second = [[t[n:] for t in scale] for scale in pred]
+    return first, second
+
 
 class Pix2PixHDDataset(torch.utils.data.Dataset):
     """Dataset class for Pix2PixHD training with flexible folder structure."""
 
-    def __init__(self, images_dir: str, feature_fold: str, label_fold: str, img_size: int = 256):
+    def __init__(
+        self,
+        images_dir: str,
+        feature_fold: str,
+        label_fold: str,
+        img_size: int = 256,
+        shard_dir: Optional[str] = None,
+        manifest_path: Optional[str] = None,
+        refresh_manifest: bool = False,
+        batch_augment: bool = False,
+        cache_bytes: int = 0,
+        pyramid_dir: Optional[str] = None,
+        return_key: bool = False,
+    ):
         """
         Initialize dataset.
 
@@ -26,36 +66,137 @@ class Pix2PixHDDataset(torch.utils.data.Dataset):
             feature_fold: Subfolder for input images (e.g., '/sketches/')
             label_fold: Subfolder for target images (e.g., '/photos/')
             img_size: Size to resize images to
+            shard_dir: Optional pre-decoded pair store written by ``mlops/pack_shards.py``.
+                When given, samples are read from its memory map instead of decoding JPEGs.
+            manifest_path: Optional pair manifest file. When given, pairs are taken from the
+                manifest (built on first use) instead of globbing the input folder.
+            refresh_manifest: Rescan the input folder and add new pairs to the manifest
+            batch_augment: Return raw uint8 CHW tensors and leave flipping and normalization
+                to a batched :class:`BatchAugment` stage after collation
+            cache_bytes: Budget for a :class:`SharedSampleCache` of decoded pairs shared by
+                all DataLoader workers (0 disables it)
+            pyramid_dir: Optional multi-resolution cache written by ``data_processing.py``.
+                Images are read from the level matching ``img_size`` instead of
+                ``images_dir`` when one is available.
+            return_key: Also return :meth:`sample_key`, used as the key of cached target
+                features
         """
         self.to_tensor = transforms.Compose(
             [transforms.ToTensor(), transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))]
         )
+        if pyramid_dir is not None:
+            level = select_level(pyramid_dir, img_size)
+            if level is not None:
+                images_dir = str(level)
         self.imagesDir = images_dir
-        self.images = glob(os.path.join(images_dir, feature_fold, "*.jpg"))
         self.feature_fold = feature_fold
         self.label_fold = label_fold
         self.img_size = img_size
+        self.batch_augment = batch_augment
+        self.return_key = return_key
+
+        self.targets: Optional[list[str]] = None
+        self.shards: Optional[ShardStore] = None
+        if shard_dir is not None:
+            self.shards = ShardStore(shard_dir)
+            if self.shards.image_size != img_size:
+                raise ValueError(
+                    f"Shard store {shard_dir} was packed at {self.shards.image_size}px, "
+                    f"but img_size={img_size} was requested"
+                )
+            self.images = self.shards.names
+        elif manifest_path is not None:
+            manifest = PairManifest.load_or_build(
+                manifest_path,
+                images_dir,
+                feature_fold,
+                label_fold,
+                self.target_path,
+                refresh=refresh_manifest,
+            )
+            self.images, self.targets = manifest.paths()
+        else:
+            # Sorted, so sample indices (sampler position, cache keys) are stable
+            self.images = sorted(glob(os.path.join(images_dir, feature_fold, "*.jpg")))
+
+        self.cache: Optional[SharedSampleCache] = None
+        if cache_bytes > 0 and self.shards is None and len(self.images) > 0:
+            self.cache = SharedSampleCache(len(self.images), img_size, cache_bytes)
+
+    def target_path(self, f_name: str) -> str:
+        """Map an input image path to its paired target image path."""
+        return (
+            f_name.replace(self.feature_fold, self.label_fold)
+            .replace("F2-", "f-")
+            .replace("-sz1", "")
+            .replace("M2-", "m-")
+        )
+
+    def target_file(self, idx: int) -> str:
+        """File the target image of sample ``idx`` is read from."""
+        return (
+            self.targets[idx] if self.targets is not None else self.target_path(self.images[idx])
+        )
+
+    def sample_key(self, idx: int) -> str:
+        """
+        Identity of the target of sample ``idx`` that survives reindexing.
+
+        Unlike the index, it does not shift when files are added to the folder or the
+        manifest. It combines the target file's path relative to the dataset root with
+        its size and mtime, so replacing the file also changes the key. Samples of a
+        shard store are identified by their source name.
+        """
+        if self.shards is not None:
+            identity = f"shard:{self.shards.names[idx]}"
+        else:
+            path = self.target_file(idx)
+            st = os.stat(path)
+            rel = os.path.relpath(path, self.imagesDir)
+            identity = f"{rel}:{st.st_size}:{st.st_mtime_ns}"
+        return hashlib.sha1(identity.encode(), usedforsecurity=False).hexdigest()[:20]
+
+    def load_pair(self, idx: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the resized RGB uint8 (source, target) arrays for a sample."""
+        if self.shards is not None:
+            return self.shards[idx]
 
-    def __getitem__(self, idx):
         f_name = self.images[idx]
+        dst_f_name = self.target_file(idx)
 
         # Load source image
         src = cv2.imread(f_name, 1)
+        if src is None:
+            raise FileNotFoundError(f"Could not read input image {f_name}")
         src = cv2.cvtColor(src, cv2.COLOR_BGR2RGB)
 
         # Load target image
-        dst_f_name = (
-            f_name.replace(self.feature_fold, self.label_fold)
-            .replace("F2-", "f-")
-            .replace("-sz1", "")
-            .replace("M2-", "m-")
-        )
         dst = cv2.imread(dst_f_name, 1)
+        if dst is None:
+            raise FileNotFoundError(f"Could not read target image {dst_f_name}")
         dst = cv2.cvtColor(dst, cv2.COLOR_BGR2RGB)
 
-        # Resize images
-        src = cv2.resize(src, (self.img_size, self.img_size))
-        dst = cv2.resize(dst, (self.img_size, self.img_size))
+        # Resize images (pre-resized pyramid levels already match)
+        if src.shape[:2] != (self.img_size, self.img_size):
+            src = cv2.resize(src, (self.img_size, self.img_size))
+        if dst.shape[:2] != (self.img_size, self.img_size):
+            dst = cv2.resize(dst, (self.img_size, self.img_size))
+        return src, dst
+
+    def __getitem__(self, idx):
+        pair = self.cache.get(idx) if self.cache is not None else None
+        if pair is None:
+            pair = self.load_pair(idx)
+            if self.cache is not None:
+                self.cache.put(idx, *pair)
+        src, dst = pair
+
+        if self.batch_augment:
+            src_tensor = torch.from_numpy(src).permute(2, 0, 1)
+            dst_tensor = torch.from_numpy(dst).permute(2, 0, 1)
+            if self.return_key:
+                return src_tensor, dst_tensor, self.sample_key(idx)
+            return src_tensor, dst_tensor
 
         # Random horizontal flip
         if random() < 0.5:
@@ -64,6 +205,8 @@ class Pix2PixHDDataset(torch.utils.data.Dataset):
 
         src_tensor = self.to_tensor(src.copy())
         dst_tensor = self.to_tensor(dst.copy())
+        if self.return_key:
+            return src_tensor, dst_tensor, self.sample_key(idx)
         return src_tensor, dst_tensor
 
     def __len__(self):
@@ -82,8 +225,19 @@ class Pix2PixHD(pl.LightningModule):
         criterion_vgg: nn.Module,
         replay_pool,
         device: Optional[torch.device] = None,
+        batch_augment: Optional[BatchAugment] = None,
         checkpoint_dir: str = "./checkpoints/",
         lambda_feat: float = 10.0,
+        reuse_fake: bool = False,
+        fuse_discriminator: bool = False,
+        log_every_n_steps: int = 50,
+        ema_decay: float = 0.9999,
+        ema_update_every: int = 1,
+        ema_warmup_steps: int = 0,
+        precision: str = "32",
+        accumulate_grad_batches: int = 1,
+        checkpoint_manager: Optional[CheckpointManager] = None,
+        checkpoint_replay_pool: str = "uint8",
     ):
         """
         Initialize Pix2PixHD model.
@@ -96,8 +250,33 @@ class Pix2PixHD(pl.LightningModule):
             criterion_vgg: VGG perceptual loss
             replay_pool: Replay buffer for fake samples
             device: Device to run on
+            batch_augment: Batched augmentation applied to training batches on the device.
+                Needed when the dataset returns raw uint8 images.
             checkpoint_dir: Directory to save checkpoints
             lambda_feat: Weight for feature matching loss
+            reuse_fake: Hand the detached fake from the generator step to the
+                discriminator step and replay pool instead of running the generator again.
+                The fake then comes from the weights before the generator update.
+            fuse_discriminator: In the discriminator step, run the real and fake pairs
+                through the discriminator as one concatenated batch and split the outputs.
+                Exact as long as the discriminator normalizes per sample (instance norm),
+                not with batch norm.
+            log_every_n_steps: Interval at which the on-device loss sums are read back for
+                the progress bar
+            ema_decay: Per-step decay of the generator weight average
+            ema_update_every: Update the average every N generator steps (with the decay
+                raised to the N-th power)
+            ema_warmup_steps: Generator steps during which the average copies the weights
+            precision: "32", "bf16" (autocast) or "16" (autocast with gradient scaling) for
+                the generator and discriminator forwards. Losses are reduced in fp32.
+            accumulate_grad_batches: Number of micro-batches whose gradients are summed
+                before each generator and discriminator optimizer step. EMA and replay
+                pool updates happen only on those steps.
+            checkpoint_manager: Background checkpoint writer with top-k retention;
+                defaults to one keeping the 3 newest checkpoints in ``checkpoint_dir``
+            checkpoint_replay_pool: How the replay pool is stored in checkpoints: "full"
+                (exact), "uint8" (quantized, a quarter of the fp32 size) or "none" (a
+                resumed run refills the pool from scratch)
         """
         super().__init__()
 
@@ -108,25 +287,150 @@ class Pix2PixHD(pl.LightningModule):
         self.criterion_vgg = criterion_vgg
         self.replay_pool = replay_pool
         self.device_to_use = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_augment = batch_augment
         self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_manager = checkpoint_manager or CheckpointManager(checkpoint_dir)
+        if checkpoint_replay_pool not in ("full", "uint8", "none"):
+            raise ValueError(
+                f"Unsupported checkpoint_replay_pool {checkpoint_replay_pool!r}, "
+                "expected 'full', 'uint8' or 'none'"
+            )
+        self.checkpoint_replay_pool = checkpoint_replay_pool
         self.lambda_feat = lambda_feat
+        self.reuse_fake = reuse_fake
+        self.fuse_discriminator = fuse_discriminator
+        self.log_every_n_steps = max(log_every_n_steps, 1)
+
+        # Mixed precision
+        if precision not in AUTOCAST_DTYPES:
+            raise ValueError(
+                f"Unsupported precision {precision!r}, expected one of {list(AUTOCAST_DTYPES)}"
+            )
+        self.precision = precision
+        self.autocast_dtype = AUTOCAST_DTYPES[precision]
+        # fp16 gradients can underflow, so each optimizer gets its own loss scaler
+        self.g_scaler = torch.amp.GradScaler(self.device_to_use.type, enabled=precision == "16")
+        self.d_scaler = torch.amp.GradScaler(self.device_to_use.type, enabled=precision == "16")
+
+        # Gradient accumulation
+        self.accumulate_grad_batches = max(accumulate_grad_batches, 1)
+        self.pending_fakes: list[dict[str, torch.Tensor]] = []
+
+        # DistributedDataParallel wrappers used for the forwards that produce gradients,
+        # see wrap_distributed. Kept out of the module tree so they are not registered
+        # twice. Only the main rank keeps the EMA and writes previews and checkpoints.
+        self.ddp: dict[str, DistributedDataParallel] = {}
+        self.is_main = True
 
         # Create EMA generator
         self.generator_ema = self._create_ema_generator()
+        self.ema = ModelEMA(
+            self.generator,
+            self.generator_ema,
+            decay=ema_decay,
+            update_every=ema_update_every,
+            warmup_steps=ema_warmup_steps,
+        )
 
-        # Loss tracking
+        # Loss tracking: per-epoch sums kept on the device, copied to loss_log on sync
         self.loss_log: dict[str, float] = {}
+        self.loss_sums: dict[str, torch.Tensor] = {}
+        # Batches summed into loss_sums; fewer than the epoch's when it was resumed
+        self.epoch_steps = 0
+
+        # Position in the training data, saved with checkpoints when the train loader
+        # uses a ResumableSampler
+        self.train_sampler: Optional[ResumableSampler] = None
+        self.total_steps = 0
+
+        # Optimizers of the current train_epoch, saved with checkpoints
+        self.g_optimizer: Optional[torch.optim.Optimizer] = None
+        self.d_optimizer: Optional[torch.optim.Optimizer] = None
+
+        # Set by request_stop (e.g. on SIGTERM); train_epoch then saves last.pt and
+        # returns early with ``preempted`` set
+        self.stop_requested = False
+        self.preempted = False
+
+        # Fixed preview batch on the device and the background image writer, both
+        # created at the first test_step
+        self.preview_batch: Optional[tuple[torch.Tensor, torch.Tensor]] = None
+        self.preview_writer: Optional[PreviewWriter] = None
 
     def _create_ema_generator(self):
         """Create exponential moving average copy of generator."""
         import copy
 
         ema_gen = copy.deepcopy(self.generator)
-        with torch.no_grad():
-            for ema_p, gen_p in zip(ema_gen.parameters(), self.generator.parameters()):
-                ema_p.data = gen_p.data.detach()
+        ema_gen.requires_grad_(False)
         return ema_gen
 
+    def prepare_batch(
+        self, data: torch.Tensor, target: torch.Tensor, augment: bool = True
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Move a batch to the device, normalize it and optionally augment it.
+
+        Args:
+            data: Input images, uint8 or already normalized
+            target: Target images, uint8 or already normalized
+            augment: Apply ``batch_augment`` (training batches only)
+
+        Returns:
+            Normalized (data, target) on the device
+        """
+        with torch.no_grad():
+            data = data.to(self.device_to_use, non_blocking=True)
+            target = target.to(self.device_to_use, non_blocking=True)
+            if augment and self.batch_augment is not None:
+                data, target = self.batch_augment(data, target)
+                return data, target
+            return normalize_batch(data), normalize_batch(target)
+
+    def wrap_distributed(self, device_ids: Optional[list[int]] = None):
+        """
+        Wrap the generator and discriminator for gradient all-reduce across ranks.
+
+        The process group must be initialized. Wrapping broadcasts the rank 0 weights, so
+        all ranks start from the same networks. Forwards of a network whose parameters are
+        frozen (the discriminator in the generator step, the generator in the
+        discriminator step) use the plain module and take no part in the reduction.
+
+        Args:
+            device_ids: CUDA device of this rank, None on CPU
+        """
+        self.ddp["generator"] = DistributedDataParallel(self.generator, device_ids=device_ids)
+        self.ddp["discriminator"] = DistributedDataParallel(
+            self.discriminator, device_ids=device_ids
+        )
+        self.is_main = dist.get_rank() == 0
+        # DDP reduces gradients once per backward, so the discriminator step must be one call
+        self.fuse_discriminator = True
+        # The average is only used on the main rank; start it from the broadcast weights
+        self.ema.copy_weights()
+
+    @property
+    def train_generator(self) -> nn.Module:
+        return self.ddp.get("generator", self.generator)
+
+    @property
+    def train_discriminator(self) -> nn.Module:
+        return self.ddp.get("discriminator", self.discriminator)
+
+    def grad_sync(self, name: str, sync: bool):
+        """Context skipping the gradient all-reduce of ``name`` unless ``sync`` is set."""
+        if sync or name not in self.ddp:
+            return nullcontext()
+        return self.ddp[name].no_sync()
+
+    def autocast(self) -> torch.autocast:
+        """Autocast context for the configured precision (a no-op for fp32)."""
+        return torch.autocast(
+            self.device_to_use.type,
+            dtype=self.autocast_dtype or torch.float32,
+            enabled=self.autocast_dtype is not None,
+        )
+
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """Forward pass through generator."""
         return self.generator(x)
@@ -141,6 +445,9 @@ class Pix2PixHD(pl.LightningModule):
         """
         Process and accumulate losses.
 
+        The running sums stay on the device, so this never waits for the device; call
+        :meth:`sync_loss_log` to read them back.
+
         Args:
             losses: Dictionary of loss components
 
@@ -149,31 +456,58 @@ class Pix2PixHD(pl.LightningModule):
         """
         loss = 0
         for k, v in losses.items():
-            if k not in self.loss_log:
-                self.loss_log[k] = 0
-            self.loss_log[k] += v.item()
+            v = v.float()
+            if k not in self.loss_sums:
+                self.loss_sums[k] = torch.zeros((), device=v.device)
+            self.loss_sums[k].add_(v.detach())
             loss = loss + v
         return loss
 
-    def calc_G_losses(self, data: torch.Tensor, target: torch.Tensor) -> dict[str, torch.Tensor]:
+    def sync_loss_log(self) -> dict[str, float]:
+        """
+        Copy the on-device loss sums into ``loss_log`` with a single device sync.
+
+        In distributed training the sums are averaged over ranks, so every rank must call
+        this at the same step.
+        """
+        if self.loss_sums:
+            values = all_reduce_mean(torch.stack(list(self.loss_sums.values()))).tolist()
+            self.loss_log = dict(zip(self.loss_sums, values))
+        return self.loss_log
+
+    def calc_G_losses(
+        self,
+        data: torch.Tensor,
+        target: torch.Tensor,
+        return_fake: bool = False,
+        keys: Optional[list[str]] = None,
+    ):
         """
         Calculate generator losses.
 
         Args:
             data: Input images
             target: Target images
+            return_fake: Also return the detached generator output
+            keys: Cache keys of the targets for a VGG loss with a feature cache
 
         Returns:
-            Dictionary of loss components
+            Dictionary of loss components, and the fake images if ``return_fake``
         """
-        fake = self.generator(data)
-        loss_vgg = 1 * self.criterion_vgg(fake, target)
-
-        pred_fake = self.discriminator(torch.cat([data, fake], axis=1))
-        loss_adv = 1 * self.criterion_gan(pred_fake, 1)
+        fake = self.train_generator(data)
+        if keys is None:
+            loss_vgg = 1 * self.criterion_vgg(fake, target)
+        else:
+            loss_vgg = 1 * self.criterion_vgg(fake, target, keys=keys)
 
+        fake_pair = torch.cat([data, fake], axis=1)
+        true_pair = torch.cat([data, target], axis=1)
+        # Not fused with the fake pass even with fuse_discriminator: the real half would
+        # then stay in the graph and double the input-gradient backward through D
+        pred_fake = self.discriminator(fake_pair)
         with torch.no_grad():
-            pred_true = self.discriminator(torch.cat([data, target], axis=1))
+            pred_true = self.discriminator(true_pair)
+        loss_adv = 1 * self.criterion_gan(pred_fake, 1)
 
         # Feature matching loss
         device = pred_fake[0][0].device if isinstance(pred_fake[0], list) else pred_fake[0].device
@@ -181,123 +515,281 @@ class Pix2PixHD(pl.LightningModule):
         adv_feats_count = 0
         for d_fake_out, d_true_out in zip(pred_fake, pred_true):
             for l_fake, l_true in zip(d_fake_out[:-1], d_true_out[:-1]):
-                loss_adv_feat = loss_adv_feat + self.criterion_feat(l_fake, l_true)
+                loss_adv_feat = loss_adv_feat + self.criterion_feat(l_fake.float(), l_true.float())
                 adv_feats_count += 1
         if adv_feats_count > 0:
             loss_adv_feat = 1 * (4.0 / adv_feats_count) * loss_adv_feat
         else:
             loss_adv_feat = torch.tensor(0.0, device=pred_fake[0].device)
 
-        return {
+        losses = {
             "G_vgg": loss_vgg,
             "G_adv": loss_adv,
             "G_adv_feat": self.lambda_feat * loss_adv_feat,
         }
+        if return_fake:
+            return losses, fake.detach().float()
+        return losses
 
-    def calc_D_losses(self, data: torch.Tensor, target: torch.Tensor) -> dict[str, torch.Tensor]:
+    def calc_D_losses(
+        self,
+        data: torch.Tensor,
+        target: torch.Tensor,
+        fake: Optional[torch.Tensor] = None,
+        update_pool: bool = True,
+    ) -> dict[str, torch.Tensor]:
         """
         Calculate discriminator losses.
 
         Args:
             data: Input images
             target: Target images
+            fake: Generator output for ``data`` if already computed; otherwise the
+                generator is run again
+            update_pool: Insert the fakes into the replay pool now. Otherwise the pool is
+                only sampled and the fakes wait in ``pending_fakes`` until
+                :meth:`flush_replay_pool` at the next optimizer step.
 
         Returns:
             Dictionary of loss components
         """
         with torch.no_grad():
-            gen_out = self.generator(data)
-            fake = self.replay_pool.query({"input": data.detach(), "output": gen_out.detach()})
-
-        pred_true = self.discriminator(torch.cat([data, target], axis=1))
+            gen_out = self.generator(data).float() if fake is None else fake
+            fresh = {"input": data.detach(), "output": gen_out.detach()}
+            pooled = self.replay_pool.query(fresh, update=update_pool)
+            if not update_pool:
+                self.pending_fakes.append(fresh)
+
+        true_pair = torch.cat([data, target], axis=1)
+        fake_pair = torch.cat([pooled["input"], pooled["output"]], axis=1)
+        if self.fuse_discriminator:
+            pred_true, pred_fake = split_predictions(
+                self.train_discriminator(torch.cat([true_pair, fake_pair])), true_pair.shape[0]
+            )
+        else:
+            pred_true = self.discriminator(true_pair)
+            pred_fake = self.discriminator(fake_pair)
         loss_true = self.criterion_gan(pred_true, 1)
-
-        pred_fake = self.discriminator(torch.cat([fake["input"], fake["output"]], axis=1))
         loss_false = self.criterion_gan(pred_fake, 0)
 
         return {"D_true": loss_true, "D_false": loss_false}
 
-    def update_ema(self, decay: float = 0.9999):
+    def flush_replay_pool(self):
+        """Insert the fakes held back during gradient accumulation into the replay pool."""
+        for fresh in self.pending_fakes:
+            self.replay_pool.add(fresh)
+        self.pending_fakes = []
+
+    def warmup(self, data: torch.Tensor, target: torch.Tensor, steps: int = 1):
         """
-        Update exponential moving average of generator weights.
+        Run generator and discriminator training passes without changing any state.
+
+        Used to trigger lazy compilation (see ``compile_modules``) before the timed
+        training loop. Gradients are discarded and the replay pool is left untouched.
 
         Args:
-            decay: EMA decay rate
+            data: Input batch as returned by the train loader
+            target: Target batch as returned by the train loader
+            steps: Number of passes
         """
-        with torch.no_grad():
-            for ema_p, gen_p in zip(self.generator_ema.parameters(), self.generator.parameters()):
-                ema_p.data = decay * ema_p.data + (1 - decay) * gen_p.data.detach()
+        data, target = self.prepare_batch(data, target)
+        for _ in range(steps):
+            self.generator.requires_grad_(True)
+            self.discriminator.requires_grad_(False)
+            fake = None
+            with self.autocast():
+                if self.reuse_fake:
+                    g_losses, fake = self.calc_G_losses(data, target, return_fake=True)
+                else:
+                    g_losses = self.calc_G_losses(data, target)
+            torch.stack([v.float() for v in g_losses.values()]).sum().backward()
+
+            self.generator.requires_grad_(False)
+            self.discriminator.requires_grad_(True)
+            with self.autocast():
+                d_losses = self.calc_D_losses(data, target, fake=fake, update_pool=False)
+            torch.stack([v.float() for v in d_losses.values()]).sum().backward()
+        self.pending_fakes = []
+        self.generator.zero_grad(set_to_none=True)
+        self.discriminator.zero_grad(set_to_none=True)
+
+    def update_ema(self) -> bool:
+        """
+        Update exponential moving average of generator weights.
+
+        Returns:
+            Whether the average was updated at this step
+        """
+        return self.ema.step()
 
     def test_step(self, test_loader: DataLoader, epoch: int, iteration: int):
         """
-        Generate test images and save them.
+        Generate preview images with the EMA generator and queue them for writing.
+
+        The first call takes one batch from ``test_loader`` and keeps it on the device, so
+        every preview shows the same samples. Encoding and the disk write happen on the
+        background ``PreviewWriter``.
 
         Args:
             test_loader: Test data loader
             epoch: Current epoch
             iteration: Current iteration
         """
-        os.makedirs(os.path.join(self.checkpoint_dir, "images"), exist_ok=True)
+        if self.preview_batch is None:
+            data, target = next(iter(test_loader))[:2]
+            self.preview_batch = self.prepare_batch(data, target, augment=False)
+        if self.preview_writer is None:
+            self.preview_writer = PreviewWriter(os.path.join(self.checkpoint_dir, "images"))
 
+        data, target = self.preview_batch
         with torch.no_grad():
-            data, target = next(iter(test_loader))
-            data = data.to(self.device_to_use)
-            target = target.to(self.device_to_use)
-
             self.generator_ema.eval()
-            out = self.generator_ema(data)
+            with self.autocast():
+                out = self.generator_ema(data).float()
             self.generator_ema.train()
+            grid = make_preview_grid(data, out, target)
+        self.preview_writer.submit(grid, f"{epoch}_{iteration}.jpg")
 
-            matrix = []
-            pairs = torch.cat([data, out, target], -1)
-            for idx in range(data.shape[0]):
-                img = 255 * (pairs[idx] + 1) / 2
-                img = img.cpu().permute(1, 2, 0).clip(0, 255).numpy().astype(np.uint8)
-                matrix.append(img)
-
-            matrix = np.vstack(matrix)
-            matrix = cv2.cvtColor(matrix, cv2.COLOR_RGB2BGR)
-
-            out_file = os.path.join(self.checkpoint_dir, "images", f"{epoch}_{iteration}.jpg")
-            cv2.imwrite(out_file, matrix)
+        # try:
+        #     matrix_rgb = grid.flip(-1).cpu().numpy()
 
-            # try:
-            #     matrix_rgb = cv2.cvtColor(matrix, cv2.COLOR_BGR2RGB)
+        #     img = wandb.Image(matrix_rgb, caption=f"Epoch {epoch}")  # type: ignore[attr-defined]
+        #     wandb.log({"generated_examples": [img]})  # type: ignore[attr-defined]
+        # except Exception:
+        #     pass
 
-            #     img = wandb.Image(matrix_rgb, caption=f"Epoch {epoch}")  # type: ignore[attr-defined]
-            #     wandb.log({"generated_examples": [img]})  # type: ignore[attr-defined]
-            # except Exception:
-            #     pass
+    def close(self):
+        """Finish writing queued previews and checkpoints."""
+        if self.preview_writer is not None:
+            self.preview_writer.close()
+            self.preview_writer = None
+        self.checkpoint_manager.wait()
 
-    def save_checkpoint(self, epoch: int):
+    def training_state(self, epoch: int, step: int = 0) -> dict[str, Any]:
         """
-        Save model checkpoint.
+        Collect everything needed to continue training at this point.
+
+        ``G`` holds the EMA weights, so inference code can keep loading it; the weights
+        being trained are stored as ``G_train``. Optimizer states are included once
+        ``train_epoch`` has been called with the optimizers.
 
         Args:
             epoch: Current epoch number
+            step: Batches done in the current epoch
+        """
+        state: dict[str, Any] = {
+            "G": self.generator_ema.state_dict(),
+            "G_train": self.generator.state_dict(),
+            "D": self.discriminator.state_dict(),
+            "ema": self.ema.state_dict(),
+            "G_scaler": self.g_scaler.state_dict(),
+            "D_scaler": self.d_scaler.state_dict(),
+            "epoch": epoch,
+            "step": step,
+            "total_steps": self.total_steps,
+            "rng": rng_state(),
+        }
+        if self.checkpoint_replay_pool != "none":
+            state["replay_pool"] = self.replay_pool.state_dict(
+                quantize=self.checkpoint_replay_pool == "uint8"
+            )
+        if self.g_optimizer is not None and self.d_optimizer is not None:
+            state["G_optimizer"] = self.g_optimizer.state_dict()
+            state["D_optimizer"] = self.d_optimizer.state_dict()
+        if self.train_sampler is not None:
+            state["sampler"] = self.train_sampler.state_dict()
+        return state
+
+    def save_checkpoint(self, epoch: int, step: int = 0, last_only: bool = False):
         """
-        os.makedirs(self.checkpoint_dir, exist_ok=True)
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M")
-        out_file = f"epoch_{epoch}_{timestamp}.pt"
-        out_path = os.path.join(self.checkpoint_dir, out_file)
+        Save the training state through the checkpoint manager.
 
-        torch.save(
-            {"G": self.generator_ema.state_dict(), "D": self.discriminator.state_dict()}, out_path
-        )
-        print(f"Saved checkpoint to {out_path}")
+        The state is snapshotted to CPU and written in the background. Checkpoints are
+        ranked by the mean of the monitored loss over ``epoch_steps`` as of the last
+        ``sync_loss_log``; if that loss is not tracked, by recency.
 
-    def load_checkpoint(self, ckpt_file: str):
+        Args:
+            epoch: Current epoch number
+            step: Batches done in the current epoch
+            last_only: Only refresh ``last.pt``, e.g. for a preemption snapshot
+        """
+        state = self.training_state(epoch, step)
+        if last_only:
+            self.checkpoint_manager.save(state)
+            print(f"Saving checkpoint to {os.path.join(self.checkpoint_dir, 'last.pt')}")
+            return
+
+        metric = None
+        monitor = self.checkpoint_manager.monitor
+        if self.epoch_steps > 0 and monitor in self.loss_log:
+            metric = self.loss_log[monitor] / self.epoch_steps
+        out_file = f"epoch_{epoch}_step_{step}.pt"
+        kept = self.checkpoint_manager.save(state, out_file, metric=metric)
+        target = out_file if kept else self.checkpoint_manager.LAST
+        print(f"Saving checkpoint to {os.path.join(self.checkpoint_dir, target)}")
+
+    def load_checkpoint(
+        self,
+        ckpt_file: str,
+        g_optimizer: Optional[torch.optim.Optimizer] = None,
+        d_optimizer: Optional[torch.optim.Optimizer] = None,
+    ) -> Optional[dict]:
         """
         Load model checkpoint.
 
+        Checkpoints with only ``G`` and ``D`` (written before the full training state
+        was saved) are still accepted: the trained generator then starts from the
+        EMA weights and the remaining state is left as is. Under distributed training the
+        random generators and replay pool are restored on rank 0 only.
+
         Args:
             ckpt_file: Path to checkpoint file
+            g_optimizer: Generator optimizer to restore, if stored
+            d_optimizer: Discriminator optimizer to restore, if stored
+
+        Returns:
+            Sampler position stored with the checkpoint, if any
         """
-        ckpt = torch.load(ckpt_file)
-        self.generator.load_state_dict(ckpt["G"])
+        ckpt = torch.load(ckpt_file, map_location=self.device_to_use)
+        self.generator.load_state_dict(ckpt.get("G_train", ckpt["G"]))
         self.generator_ema.load_state_dict(ckpt["G"])
         self.discriminator.load_state_dict(ckpt["D"])
+        if "ema" in ckpt:
+            self.ema.load_state_dict(ckpt["ema"])
+        if g_optimizer is not None and "G_optimizer" in ckpt:
+            g_optimizer.load_state_dict(ckpt["G_optimizer"])
+        if d_optimizer is not None and "D_optimizer" in ckpt:
+            d_optimizer.load_state_dict(ckpt["D_optimizer"])
+        # A disabled scaler has an empty state
+        if ckpt.get("G_scaler") and self.g_scaler.is_enabled():
+            self.g_scaler.load_state_dict(ckpt["G_scaler"])
+        if ckpt.get("D_scaler") and self.d_scaler.is_enabled():
+            self.d_scaler.load_state_dict(ckpt["D_scaler"])
+        self.total_steps = ckpt.get("total_steps", 0)
+        # Only rank 0 saves, so the generators and replay pool in the checkpoint are its
+        # own; the other ranks start fresh pools and streams seeded by their rank
+        if self.is_main:
+            if "replay_pool" in ckpt:
+                self.replay_pool.load_state_dict(ckpt["replay_pool"])
+            if "rng" in ckpt:
+                set_rng_state(ckpt["rng"])
+        else:
+            seed_rng(self.total_steps * 65536 + dist.get_rank())
         print(f"Loaded checkpoint from {ckpt_file}")
+        sampler_state: Optional[dict] = ckpt.get("sampler")
+        return sampler_state
+
+    def request_stop(self):
+        """
+        Ask training to snapshot and stop at the next optimizer step.
+
+        Safe to call from a signal handler; see ``train_epoch``.
+        """
+        self.stop_requested = True
+
+    def should_stop(self) -> bool:
+        """Whether any rank was asked to stop; a collective when training distributed."""
+        return any_rank(self.stop_requested, self.device_to_use)
 
     def train_epoch(
         self,
@@ -310,6 +802,10 @@ class Pix2PixHD(pl.LightningModule):
         """
         Train for one epoch.
 
+        After ``request_stop`` the epoch ends at the next optimizer step (under distributed
+        training, the first one after the next ``log_every_n_steps`` boundary): ``last.pt``
+        is written with the full training state and ``preempted`` is set.
+
         Args:
             train_loader: Training data loader
             test_loader: Test data loader
@@ -318,48 +814,119 @@ class Pix2PixHD(pl.LightningModule):
             d_optimizer: Discriminator optimizer
         """
         print(f"Training epoch {epoch}...")
+        # N counts batches of the whole epoch, so a resumed epoch continues the previous
+        # run's numbering; losses are averaged over the batches run since the resume
+        N = 0
+        if isinstance(train_loader.sampler, ResumableSampler):
+            self.train_sampler = train_loader.sampler
+            self.train_sampler.set_epoch(epoch)
+            if self.train_sampler.offset > 0:
+                N = self.train_sampler.offset // (train_loader.batch_size or 1)
+                print(f"Resuming epoch {epoch} at sample {self.train_sampler.offset}")
+        self.g_optimizer, self.d_optimizer = g_optimizer, d_optimizer
         self.generator.train()
         self.discriminator.train()
         self.loss_log = {}
-
-        N = 0
-        pbar = tqdm(train_loader)
-
-        for data, target in pbar:
-            with torch.no_grad():
-                data = data.to(self.device_to_use)
-                target = target.to(self.device_to_use)
+        self.loss_sums = {}
+        self.epoch_steps = 0
+
+        # A resumed sampler shrinks as it advances, so take the length up front
+        num_batches = N + len(train_loader)
+        pbar = tqdm(train_loader, initial=N, total=num_batches, disable=not self.is_main)
+        save_due = stop_due = False
+
+        accumulate = self.accumulate_grad_batches
+        window, window_size = 0, 1
+        for data, target, *sample_keys in pbar:
+            data, target = self.prepare_batch(data, target)
+            keys = None
+            if sample_keys and self.batch_augment is not None:
+                keys = self.batch_augment.cache_keys(sample_keys[0])
+
+            # Gradients are summed over a window of micro-batches; the last window of an
+            # epoch may be shorter, so losses are scaled by the actual window size
+            if window == 0:
+                window_size = max(min(accumulate, num_batches - N), 1)
+                g_optimizer.zero_grad()
+                d_optimizer.zero_grad()
+            window += 1
+            optimizer_step = window == window_size
 
             # Train Generator
-            g_optimizer.zero_grad()
             self.generator.requires_grad_(True)
             self.discriminator.requires_grad_(False)
-            g_losses = self.calc_G_losses(data, target)
-            g_loss = self.process_loss(g_losses)
-            g_loss.backward()
-            g_optimizer.step()
-            self.update_ema()
+            fake = None
+            with self.grad_sync("generator", optimizer_step):
+                with self.autocast():
+                    if self.reuse_fake:
+                        g_losses, fake = self.calc_G_losses(
+                            data, target, return_fake=True, keys=keys
+                        )
+                    else:
+                        g_losses = self.calc_G_losses(data, target, keys=keys)
+                g_loss = self.process_loss(g_losses)
+                self.g_scaler.scale(g_loss / window_size).backward()
+            if optimizer_step:
+                self.g_scaler.step(g_optimizer)
+                self.g_scaler.update()
+                if self.is_main:
+                    self.update_ema()
 
             # Train Discriminator
-            d_optimizer.zero_grad()
             self.generator.requires_grad_(False)
             self.discriminator.requires_grad_(True)
-            d_losses = self.calc_D_losses(data, target)
-            d_loss = self.process_loss(d_losses)
-            d_loss.backward()
-            d_optimizer.step()
+            with self.grad_sync("discriminator", optimizer_step):
+                with self.autocast():
+                    d_losses = self.calc_D_losses(
+                        data, target, fake=fake, update_pool=accumulate == 1
+                    )
+                d_loss = self.process_loss(d_losses)
+                self.d_scaler.scale(d_loss / window_size).backward()
+            if optimizer_step:
+                self.d_scaler.step(d_optimizer)
+                self.d_scaler.update()
+                self.flush_replay_pool()
+                window = 0
 
             N += 1
+            self.epoch_steps += 1
+            self.total_steps += 1
+            if self.train_sampler is not None:
+                self.train_sampler.advance(len(data))
+
+            # Preemption: snapshot after the first optimizer step following a stop
+            # request, so no accumulated gradients are lost, then leave the epoch. Across
+            # ranks the request is shared by a collective, so under DDP it is only checked
+            # every log_every_n_steps batches, alongside the loss sync
+            if N % self.log_every_n_steps == 0 or not is_distributed():
+                stop_due = stop_due or self.should_stop()
+            if stop_due and window == 0:
+                if self.is_main:
+                    self.save_checkpoint(epoch, N, last_only=True)
+                    self.checkpoint_manager.wait()
+                self.preempted = True
+                break
 
             # Test sampling
-            if (N % 100 == 0) or (len(train_loader) <= N + 1):
-                for i in range(3):
-                    self.test_step(test_loader, epoch, N + i)
+            if self.is_main and ((N % 100 == 0) or (num_batches <= N + 1)):
+                self.test_step(test_loader, epoch, N)
 
             # Update progress bar
-            txt = " | ".join([f"{k}: {self.loss_log[k] / N:.3e}" for k in self.loss_log])
-            pbar.set_description(txt)
-
-            # Save checkpoint
-            if (N % 1000 == 0) or (len(train_loader) <= N + 1):
-                self.save_checkpoint(epoch)
+            if N % self.log_every_n_steps == 0:
+                self.sync_loss_log()
+                txt = " | ".join(
+                    [f"{k}: {self.loss_log[k] / self.epoch_steps:.3e}" for k in self.loss_log]
+                )
+                pbar.set_description(txt)
+
+            # Save checkpoint; every rank joins the loss sync that ranks checkpoints. A save
+            # falling inside an accumulation window waits for its optimizer step, since
+            # the partial gradients are not part of the checkpoint
+            save_due = save_due or (N % 1000 == 0) or (num_batches <= N + 1)
+            if save_due and window == 0:
+                save_due = False
+                self.sync_loss_log()
+                if self.is_main:
+                    self.save_checkpoint(epoch, N)
+
+        self.sync_loss_log()
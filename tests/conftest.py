@@ -0,0 +1,17 @@
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def pair_dir(tmp_path):
+    """Create a small sketches/ + images/ folder of random JPEG pairs."""
+    rng = np.random.default_rng(0)
+    (tmp_path / "sketches").mkdir()
+    (tmp_path / "images").mkdir()
+    for i in range(6):
+        sketch = rng.integers(0, 255, size=(40, 48, 3), dtype=np.uint8)
+        photo = rng.integers(0, 255, size=(40, 48, 3), dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / "sketches" / f"{i:04d}.jpg"), sketch)
+        cv2.imwrite(str(tmp_path / "images" / f"{i:04d}.jpg"), photo)
+    return tmp_path
@@ -0,0 +1,48 @@
+import numpy as np
+import torch
+from torchvision import transforms
+
+from mlops.src.data.augmentation import BatchAugment, normalize_batch
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+def test_normalize_batch_matches_per_sample_transform():
+    img = np.random.default_rng(0).integers(0, 255, size=(8, 8, 3), dtype=np.uint8)
+    to_tensor = transforms.Compose(
+        [transforms.ToTensor(), transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))]
+    )
+    batch = torch.from_numpy(img).permute(2, 0, 1)[None]
+    torch.testing.assert_close(normalize_batch(batch)[0], to_tensor(img))
+
+
+def test_batch_augment_flips_input_and_target_together():
+    torch.manual_seed(0)
+    src = torch.randint(0, 255, (64, 3, 8, 8), dtype=torch.uint8)
+    out_src, out_dst = BatchAugment(horizontal_flip=0.5)(src, src.clone())
+
+    torch.testing.assert_close(out_src, out_dst)
+    flipped = (out_src == normalize_batch(src).flip(-1)).flatten(1).all(1)
+    kept = (out_src == normalize_batch(src)).flatten(1).all(1)
+    assert (flipped | kept).all()
+    assert 0 < flipped.sum() < len(src)
+
+
+def test_dataset_returns_raw_uint8_for_batch_augment(pair_dir):
+    dataset = Pix2PixHDDataset(
+        str(pair_dir), "sketches/", "images/", img_size=16, batch_augment=True
+    )
+    src, dst = dataset[0]
+    assert src.dtype == dst.dtype == torch.uint8
+    assert src.shape == (3, 16, 16)
+
+
+def test_configured_augmentation_applies_same_transform_to_pair():
+    torch.manual_seed(0)
+    src = torch.randint(0, 255, (16, 3, 12, 12), dtype=torch.uint8)
+    augment = BatchAugment(horizontal_flip=0.5, rotation=15, brightness=0.2, contrast=0.2)
+    out_src, out_dst = augment(src, src.clone())
+
+    torch.testing.assert_close(out_src, out_dst)
+    assert out_src.shape == (16, 3, 12, 12)
+    assert out_src.min() >= -1 and out_src.max() <= 1
+    assert not torch.allclose(out_src, normalize_batch(src))
@@ -0,0 +1,88 @@
+import pytest
+import torch
+
+from mlops.src.components.checkpoint import CheckpointManager
+
+
+def file_names(path):
+    return sorted(p.name for p in path.glob("*.pt"))
+
+
+def test_keeps_top_k_by_metric_and_last(tmp_path):
+    manager = CheckpointManager(str(tmp_path), save_top_k=2, monitor="loss", mode="min")
+    for i, loss in enumerate([3.0, 1.0, 2.0, 5.0, 0.5]):
+        manager.save({"w": torch.full((4,), float(i))}, f"{i}.pt", metric=loss)
+    manager.wait()
+
+    assert file_names(tmp_path) == ["1.pt", "4.pt", "last.pt"]
+    assert manager.best_path == tmp_path / "4.pt"
+    torch.testing.assert_close(torch.load(tmp_path / "last.pt")["w"], torch.full((4,), 4.0))
+
+
+def test_max_mode_and_recency(tmp_path):
+    best = CheckpointManager(str(tmp_path / "max"), save_top_k=1, save_last=False, mode="max")
+    recent = CheckpointManager(str(tmp_path / "recent"), save_top_k=2, save_last=False)
+    for i, score in enumerate([1.0, 3.0, 2.0]):
+        best.save({"step": i}, f"{i}.pt", metric=score)
+        recent.save({"step": i}, f"{i}.pt")
+    best.wait()
+    recent.wait()
+
+    assert file_names(tmp_path / "max") == ["1.pt"]
+    assert file_names(tmp_path / "recent") == ["1.pt", "2.pt"]
+
+
+def test_ranking_survives_a_restart(tmp_path):
+    manager = CheckpointManager(str(tmp_path), save_top_k=3, monitor="loss")
+    for i, loss in enumerate([3.0, 1.0, 2.0]):
+        manager.save({"step": i}, f"{i}.pt", metric=loss)
+    manager.wait()
+
+    restarted = CheckpointManager(str(tmp_path), save_top_k=2, monitor="loss")
+    assert restarted.best_path == tmp_path / "1.pt"
+    assert file_names(tmp_path) == ["1.pt", "2.pt", "last.pt"]
+
+    assert not restarted.save({"step": 3}, "3.pt", metric=2.5)
+    assert restarted.save({"step": 4}, "4.pt", metric=0.5)
+    restarted.wait()
+    assert file_names(tmp_path) == ["1.pt", "4.pt", "last.pt"]
+
+    # Scores of another metric are not comparable
+    assert CheckpointManager(str(tmp_path), monitor="fid").best == []
+
+
+def test_other_ranks_leave_the_directory_alone(tmp_path):
+    manager = CheckpointManager(str(tmp_path), save_top_k=3, monitor="loss")
+    for i, loss in enumerate([3.0, 1.0, 2.0]):
+        manager.save({"step": i}, f"{i}.pt", metric=loss)
+    manager.wait()
+    index = (tmp_path / "index.json").read_text()
+
+    other = CheckpointManager(str(tmp_path), save_top_k=1, monitor="loss", is_main=False)
+    assert not other.save({"step": 3}, "3.pt", metric=0.5)
+    other.wait()
+    assert other.best == []
+    assert file_names(tmp_path) == ["0.pt", "1.pt", "2.pt", "last.pt"]
+    assert (tmp_path / "index.json").read_text() == index
+
+
+def test_snapshot_is_isolated_from_later_updates(tmp_path):
+    manager = CheckpointManager(str(tmp_path), save_top_k=-1)
+    weights = torch.zeros(1000)
+    manager.save({"w": weights, "meta": {"epoch": 0}}, "a.pt")
+    weights.add_(1)
+    manager.save({"w": weights, "meta": {"epoch": 1}}, "b.pt")
+    manager.wait()
+
+    a, b = torch.load(tmp_path / "a.pt"), torch.load(tmp_path / "b.pt")
+    assert a["meta"] == {"epoch": 0} and b["meta"] == {"epoch": 1}
+    assert a["w"].sum() == 0 and b["w"].sum() == 1000
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_write_errors_surface_on_next_call(tmp_path):
+    (tmp_path / "file").touch()
+    manager = CheckpointManager(str(tmp_path / "file" / "ckpt"))
+    manager.save({"w": torch.zeros(1)}, "a.pt")
+    with pytest.raises(RuntimeError):
+        manager.wait()
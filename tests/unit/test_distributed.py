@@ -0,0 +1,196 @@
+import json
+import os
+import socket
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from mlops.src.components.checkpoint import CheckpointManager
+from mlops.src.components.distributed import setup_distributed
+from mlops.src.components.replay_pool import ReplayPool
+from mlops.src.data.sampler import ResumableSampler
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def train_rank(rank, world_size, port, tmp_path, accumulate, shared_dir=False):
+    import contextlib
+    import io
+
+    from tests.unit.test_pix2pixhd import make_model
+
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        LOCAL_RANK=str(rank),
+        LOCAL_WORLD_SIZE=str(world_size),
+    )
+    ctx = setup_distributed("gloo", threads_per_process=1)
+    # Different initial weights per rank; wrapping broadcasts those of rank 0
+    torch.manual_seed(rank)
+    checkpoint_dir = tmp_path / ("shared" if shared_dir else str(rank))
+    model = make_model(
+        checkpoint_dir,
+        reuse_fake=True,
+        accumulate_grad_batches=accumulate,
+        checkpoint_manager=CheckpointManager(
+            str(checkpoint_dir), save_top_k=1, is_main=ctx.is_main
+        ),
+    )
+    model.wrap_distributed()
+    g_optimizer, d_optimizer = model.configure_optimizers()
+
+    torch.manual_seed(10)
+    images = torch.rand(8, 3, 32, 32) * 2 - 1
+    dataset = torch.utils.data.TensorDataset(images, images.flip(-1))
+    sampler = ResumableSampler(dataset, num_replicas=ctx.world_size, rank=ctx.rank)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=2, sampler=sampler)
+    test_loader = torch.utils.data.DataLoader(dataset, batch_size=2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train_epoch(loader, test_loader, 0, g_optimizer, d_optimizer)
+    model.close()
+
+    torch.save(
+        {
+            "G": model.generator.state_dict(),
+            "D": model.discriminator.state_dict(),
+            "loss_log": model.loss_log,
+            "is_main": model.is_main,
+        },
+        tmp_path / f"rank{rank}.pt",
+    )
+    dist.destroy_process_group()
+
+
+@pytest.mark.parametrize("accumulate", [1, 2])
+def test_ranks_stay_in_sync(tmp_path, accumulate):
+    mp.spawn(train_rank, args=(2, free_port(), tmp_path, accumulate), nprocs=2)
+    states = [torch.load(tmp_path / f"rank{r}.pt") for r in range(2)]
+
+    assert [s["is_main"] for s in states] == [True, False]
+    assert states[0]["loss_log"] == states[1]["loss_log"]
+    for name in ("G", "D"):
+        for k, v in states[0][name].items():
+            torch.testing.assert_close(states[1][name][k], v)
+    # Only the main rank writes previews and checkpoints
+    assert any((tmp_path / "0").iterdir())
+    assert not (tmp_path / "1").exists()
+
+
+def test_ranks_share_a_checkpoint_dir(tmp_path):
+    # The second run finds the first run's index; only rank 0 may rewrite it
+    for _ in range(2):
+        mp.spawn(train_rank, args=(2, free_port(), tmp_path, 1, True), nprocs=2)
+
+    shared = tmp_path / "shared"
+    assert sorted(p.name for p in shared.glob("*.pt")) == ["epoch_0_step_2.pt", "last.pt"]
+    index = json.loads((shared / "index.json").read_text())
+    assert [name for _, name in index["best"]] == ["epoch_0_step_2.pt"]
+    assert index["saves"] == 4
+
+
+def resume_rank(rank, world_size, port, tmp_path):
+    from tests.unit.test_pix2pixhd import make_model
+
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        LOCAL_RANK=str(rank),
+        LOCAL_WORLD_SIZE=str(world_size),
+    )
+    setup_distributed("gloo", threads_per_process=1)
+    model = make_model(tmp_path / str(rank))
+    model.replay_pool = ReplayPool(4)
+    model.wrap_distributed()
+    model.load_checkpoint(str(tmp_path / "last.pt"))
+    torch.save(
+        {"draw": torch.rand(8), "pool": len(model.replay_pool.data)},
+        tmp_path / f"rank{rank}.pt",
+    )
+    dist.destroy_process_group()
+
+
+def test_resumed_ranks_keep_separate_random_streams(tmp_path):
+    from tests.unit.test_pix2pixhd import make_model
+
+    model = make_model(tmp_path)
+    model.replay_pool = ReplayPool(4)
+    model.calc_D_losses(torch.rand(2, 3, 32, 32), torch.rand(2, 3, 32, 32))
+    model.save_checkpoint(0, last_only=True)
+    model.close()
+
+    mp.spawn(resume_rank, args=(2, free_port(), tmp_path), nprocs=2)
+    states = [torch.load(tmp_path / f"rank{r}.pt") for r in range(2)]
+
+    # Rank 0 continues the saved stream and pool, rank 1 gets its own
+    assert [s["pool"] for s in states] == [2, 0]
+    assert not torch.equal(states[0]["draw"], states[1]["draw"])
+
+
+def stop_rank(rank, world_size, port, tmp_path, stop):
+    import contextlib
+    import io
+
+    from tests.unit.test_pix2pixhd import make_model
+
+    import mlops.src.models.pix2pixhd_module as module
+
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        LOCAL_RANK=str(rank),
+        LOCAL_WORLD_SIZE=str(world_size),
+    )
+    ctx = setup_distributed("gloo", threads_per_process=1)
+    model = make_model(tmp_path / str(rank), log_every_n_steps=2)
+    model.wrap_distributed()
+    g_optimizer, d_optimizer = model.configure_optimizers()
+    calls = []
+    any_rank = module.any_rank
+
+    def counting_any_rank(*args):
+        calls.append(args)
+        return any_rank(*args)
+
+    module.any_rank = counting_any_rank
+    if stop and rank == 1:
+        model.request_stop()
+
+    images = torch.rand(16, 3, 32, 32) * 2 - 1
+    dataset = torch.utils.data.TensorDataset(images, images)
+    sampler = ResumableSampler(dataset, num_replicas=ctx.world_size, rank=ctx.rank)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=2, sampler=sampler)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train_epoch(loader, loader, 0, g_optimizer, d_optimizer)
+    model.close()
+    torch.save(
+        {"calls": len(calls), "steps": model.total_steps, "preempted": model.preempted},
+        tmp_path / f"rank{rank}.pt",
+    )
+    dist.destroy_process_group()
+
+
+@pytest.mark.parametrize("stop", [False, True])
+def test_stop_requests_are_shared_at_the_log_interval(tmp_path, stop):
+    mp.spawn(stop_rank, args=(2, free_port(), tmp_path, stop), nprocs=2)
+    states = [torch.load(tmp_path / f"rank{r}.pt") for r in range(2)]
+
+    # 4 batches per rank, logged every 2; a stop on rank 1 ends both at the first check
+    expected = (
+        {"calls": 1, "steps": 2, "preempted": True}
+        if stop
+        else {"calls": 2, "steps": 4, "preempted": False}
+    )
+    assert states == [expected, expected]
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+import pytest
+
+from mlops.src.data.edges2shoes import Edges2ShoesDataset
+
+
+@pytest.fixture
+def edges2shoes_dir(tmp_path):
+    """Side-by-side 32x64 A|B images: a red edge half and a blue photo half."""
+    (tmp_path / "train").mkdir()
+    combined = np.zeros((32, 64, 3), dtype=np.uint8)
+    combined[:, :32] = (0, 0, 255)  # BGR red
+    combined[:, 32:] = (255, 0, 0)  # BGR blue
+    for name in ("3_AB.jpg", "10_AB.jpg", "1_AB.jpg"):
+        cv2.imwrite(str(tmp_path / "train" / name), combined)
+    return tmp_path
+
+
+@pytest.mark.parametrize("img_size", [32, 16])
+def test_halves_are_split_and_resized(edges2shoes_dir, img_size):
+    dataset = Edges2ShoesDataset(str(edges2shoes_dir), img_size=img_size, batch_augment=True)
+    assert len(dataset) == 3
+
+    edges, photo = dataset.load_pair(0)
+    assert edges.shape == photo.shape == (img_size, img_size, 3)
+    # RGB after decoding; JPEG leaves a little noise at the seam
+    np.testing.assert_allclose(edges.mean((0, 1)), (255, 0, 0), atol=8)
+    np.testing.assert_allclose(photo.mean((0, 1)), (0, 0, 255), atol=8)
+
+
+def test_file_order_is_sorted(edges2shoes_dir):
+    dataset = Edges2ShoesDataset(str(edges2shoes_dir), img_size=32)
+    assert dataset.images == sorted(dataset.images)
@@ -0,0 +1,128 @@
+import json
+from pathlib import Path
+import shutil
+
+import torch
+from torch import nn
+
+from mlops.src.components.feature_cache import VGGFeatureCache
+from mlops.src.data.augmentation import BatchAugment
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+class TinyFeatures(nn.Module):
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.conv1 = nn.Conv2d(3, 4, 3, padding=1)
+        self.conv2 = nn.Conv2d(4, 8, 3, stride=2, padding=1)
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += x.shape[0]
+        h1 = self.conv1(x)
+        return [h1, self.conv2(h1)]
+
+
+def test_cached_features_match_fresh(tmp_path):
+    vgg = TinyFeatures()
+    cache = VGGFeatureCache(str(tmp_path), max_bytes=10**7, dtype="float32")
+    y = torch.rand(3, 3, 16, 16)
+
+    first = cache.features(vgg, y, ["0-0", "1-0", "2-1"])
+    assert vgg.calls == 3
+    second = cache.features(vgg, y[[2, 0]], ["2-1", "0-0"])
+    assert vgg.calls == 3
+    assert cache.hits == 2
+
+    for f_cached, f_fresh in zip(second, vgg(y[[2, 0]])):
+        torch.testing.assert_close(f_cached, f_fresh)
+    for f_first, f_fresh in zip(first, vgg(y)):
+        torch.testing.assert_close(f_first, f_fresh.detach())
+
+    # Entries survive a restart
+    reopened = VGGFeatureCache(str(tmp_path), max_bytes=10**7, dtype="float32")
+    assert len(reopened) == 3
+    reopened.features(vgg, y[:1], ["0-0"])
+    assert reopened.hits == 1
+
+
+def test_eviction_keeps_budget(tmp_path):
+    vgg = TinyFeatures()
+    y = torch.rand(4, 3, 16, 16)
+    cache = VGGFeatureCache(str(tmp_path), max_bytes=10**7, dtype="float16")
+    cache.features(vgg, y[:1], ["0-0"])
+    entry_bytes = cache.total_bytes
+
+    cache = VGGFeatureCache(str(tmp_path), max_bytes=2 * entry_bytes, dtype="float16")
+    cache.features(vgg, y, ["0-0", "1-0", "2-0", "3-0"])
+    assert len(cache) == 2
+    assert cache.total_bytes <= 2 * entry_bytes
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+
+
+def test_cache_keys_follow_flips():
+    augment = BatchAugment(horizontal_flip=0.5)
+    src = torch.randint(0, 256, (8, 3, 4, 4), dtype=torch.uint8)
+    _, dst = augment(src, src.clone())
+    keys = augment.cache_keys([str(i) for i in range(8)])
+    assert keys is not None
+    flipped = [k.endswith("-1") for k in keys]
+    for i, f in enumerate(flipped):
+        expected = src[i].flip(-1) if f else src[i]
+        torch.testing.assert_close(dst[i], expected.float() / 127.5 - 1)
+
+    assert BatchAugment(horizontal_flip=0.5, rotation=10).cache_keys(["0"] * 8) is None
+
+
+def test_keys_survive_dataset_reordering(pair_dir, tmp_path):
+    vgg = TinyFeatures()
+    cache = VGGFeatureCache(str(tmp_path / "cache"), max_bytes=10**7, dtype="float32")
+
+    def fill(dataset):
+        samples = [dataset[i] for i in range(len(dataset))]
+        target = torch.stack([t for _, t, _ in samples]).float() / 127.5 - 1
+        keys = [f"{key}-0" for _, _, key in samples]
+        cache.features(vgg, target, keys)
+        return keys
+
+    args = (str(pair_dir), "sketches/", "images/", 16)
+    keys = fill(Pix2PixHDDataset(*args, batch_augment=True, return_key=True))
+    assert cache.misses == 6
+
+    # A new pair sorting first shifts every index by one
+    for folder in ("sketches", "images"):
+        shutil.copy(pair_dir / folder / "0003.jpg", pair_dir / folder / "-001.jpg")
+    reordered = Pix2PixHDDataset(*args, batch_augment=True, return_key=True)
+    assert reordered[1][2] == keys[0][:-2]
+
+    new_keys = fill(reordered)
+    assert new_keys[1:] == keys
+    assert (cache.hits, cache.misses) == (6, 7)
+
+
+def test_changed_params_clear_the_cache(tmp_path):
+    vgg = TinyFeatures()
+    cache = VGGFeatureCache(str(tmp_path), max_bytes=10**7, params={"precision": "32"})
+    cache.features(vgg, torch.rand(2, 3, 16, 16), ["a-0", "b-0"])
+
+    assert len(VGGFeatureCache(str(tmp_path), 10**7, params={"precision": "32"})) == 2
+    assert len(VGGFeatureCache(str(tmp_path), 10**7, params={"precision": "bf16"})) == 0
+    assert len(VGGFeatureCache(str(tmp_path), 10**7, dtype="float32")) == 0
+    assert not list(tmp_path.glob("*.npy"))
+
+
+def test_files_removed_by_another_process_are_skipped(tmp_path, monkeypatch):
+    cache = VGGFeatureCache(str(tmp_path), max_bytes=10**7, params={"precision": "32"})
+    cache.features(TinyFeatures(), torch.rand(2, 3, 8, 8), ["a-0", "b-0"])
+
+    # Another rank deletes a file between this process listing and removing it
+    glob = Path.glob
+    monkeypatch.setattr(
+        Path, "glob", lambda self, pattern: [*glob(self, pattern), self / "gone.npy"]
+    )
+    assert len(VGGFeatureCache(str(tmp_path), 10**7, params={"precision": "bf16"})) == 0
+    monkeypatch.undo()
+
+    assert not list(tmp_path.glob("*.npy")) and not list(tmp_path.glob("*.tmp"))
+    assert json.loads((tmp_path / "params.json").read_text())["precision"] == "bf16"
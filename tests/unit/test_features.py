@@ -0,0 +1,44 @@
+import shutil
+
+from mlops.features import validate_files, validate_image
+from mlops.src.data.file_ledger import FileLedger
+
+
+def test_header_mode_reads_size_and_flags_corrupt_files(pair_dir):
+    sketch = pair_dir / "sketches" / "0000.jpg"
+    corrupt = pair_dir / "sketches" / "0001.jpg"
+    corrupt.write_bytes(b"not an image" * 10)
+    truncated = pair_dir / "sketches" / "0002.jpg"
+    truncated.write_bytes(truncated.read_bytes()[:1000])
+
+    result = validate_image(sketch, mode="header")
+    assert result["ok"] and (result["width"], result["height"]) == (48, 40)
+    assert not validate_image(corrupt, mode="header")["ok"]
+    # Only a full decode notices missing pixel data
+    assert validate_image(truncated, mode="header")["ok"]
+    assert not validate_image(truncated, mode="full")["ok"]
+    assert validate_image(sketch, mode="full")["ok"]
+
+
+def test_known_hashes_are_reused_for_copied_files(pair_dir):
+    sketch = pair_dir / "sketches" / "0000.jpg"
+    first = validate_image(sketch)
+    copy = shutil.copy(sketch, pair_dir / "copy.jpg")
+
+    # The stored outcome is returned without opening the image again
+    known = {first["sha1"]: {**first, "width": 1}}
+    assert validate_image(copy, known=known)["width"] == 1
+
+
+def test_only_new_or_changed_files_are_validated_again(pair_dir, tmp_path):
+    files = sorted((pair_dir / "sketches").glob("*.jpg"))
+    cache_path = str(tmp_path / "validation_cache.json")
+
+    assert validate_files(files, FileLedger(cache_path)) == files
+    assert validate_files(files, FileLedger(cache_path)) == []
+
+    files[2].write_bytes(b"truncated")
+    cache = FileLedger(cache_path)
+    assert validate_files(files, cache) == [files[2]]
+    assert not cache.entries[str(files[2])]["ok"]
+    assert cache.entries[str(files[0])]["ok"]
@@ -0,0 +1,101 @@
+import os
+import shutil
+
+from mlops.data_processing import preprocess
+from mlops.src.data.file_ledger import FileLedger
+
+
+def test_unchanged_files_are_current(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"abcd")
+    ledger = FileLedger(str(tmp_path / "ledger.json"))
+    assert not ledger.is_current(str(path))
+
+    ledger.record(str(path), result=1)
+    entry = ledger.get(str(path))
+    assert entry is not None and entry["result"] == 1
+
+
+def test_touched_file_falls_back_to_content_hash(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"abcd")
+    ledger = FileLedger(str(tmp_path / "ledger.json"))
+    ledger.record(str(path))
+
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    assert ledger.is_current(str(path))
+    assert ledger.entries[str(path)]["mtime"] == st.st_mtime + 10
+
+    # Same size, different content
+    path.write_bytes(b"abce")
+    os.utime(path, (st.st_atime, st.st_mtime + 20))
+    assert not ledger.is_current(str(path))
+
+
+def test_ledger_persists_and_resets_on_new_params(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"abcd")
+    ledger_path = str(tmp_path / "ledger.json")
+    ledger = FileLedger(ledger_path, params={"resize": 256})
+    ledger.record(str(path))
+    ledger.save()
+
+    assert FileLedger(ledger_path, params={"resize": 256}).is_current(str(path))
+    assert len(FileLedger(ledger_path, params={"resize": 512})) == 0
+
+
+def test_prune_drops_entries_of_missing_files(tmp_path):
+    ledger = FileLedger(str(tmp_path / "ledger.json"))
+    for name in ("a", "b"):
+        (tmp_path / name).write_bytes(b"x")
+        ledger.record(str(tmp_path / name))
+
+    assert ledger.prune({str(tmp_path / "a")}) == [str(tmp_path / "b")]
+    assert list(ledger.entries) == [str(tmp_path / "a")]
+
+
+def run(raw, out, ledger_path, **kwargs):
+    return preprocess(
+        raw,
+        out / "sketches",
+        out / "images",
+        16,
+        FileLedger(str(ledger_path), params={"resize": 16}),
+        **kwargs,
+    )
+
+
+def test_preprocess_only_redoes_changed_pairs(pair_dir, tmp_path):
+    out, ledger_path = tmp_path / "processed", tmp_path / "ledger.json"
+
+    assert run(pair_dir, out, ledger_path)["processed"] == 6
+    assert run(pair_dir, out, ledger_path) == {
+        "processed": 0,
+        "failed": 0,
+        "skipped": 6,
+        "pruned": 0,
+    }
+
+    shutil.copy(pair_dir / "images" / "0000.jpg", pair_dir / "images" / "0001.jpg")
+    os.remove(out / "sketches" / "0002.jpg")
+    stats = run(pair_dir, out, ledger_path)
+    assert (stats["processed"], stats["skipped"]) == (2, 4)
+
+
+def test_preprocess_prunes_outputs_of_deleted_pairs(pair_dir, tmp_path):
+    out, ledger_path = tmp_path / "processed", tmp_path / "ledger.json"
+    pyramid = tmp_path / "pyramid"
+    run(pair_dir, out, ledger_path, pyramid_dir=str(pyramid), pyramid_sizes=[8, 24])
+
+    for folder in ("sketches", "images"):
+        os.remove(pair_dir / folder / "0003.jpg")
+    stats = run(pair_dir, out, ledger_path, pyramid_dir=str(pyramid), pyramid_sizes=[8])
+
+    assert stats["processed"] == 0 and stats["pruned"] == 4
+    assert not (out / "images" / "0003.jpg").exists()
+    assert not (pyramid / "8" / "sketches" / "0003.jpg").exists()
+    assert not (pyramid / "24").exists()
+    ledger = FileLedger(str(ledger_path), params={"resize": 16})
+    assert len(ledger) == 10
+    assert str(pair_dir / "images" / "0003.jpg") not in ledger.entries
@@ -0,0 +1,33 @@
+import pytest
+import torch
+
+from mlops.src.components.generator import define_G
+
+
+def make_generator(checkpointing):
+    torch.manual_seed(0)
+    return define_G(
+        3, 3, 8, "global", n_downsample_global=2, n_blocks_global=3, checkpointing=checkpointing
+    )
+
+
+@pytest.mark.parametrize("checkpointing", ["trunk", "full"])
+def test_checkpointing_matches_plain_backward(checkpointing):
+    reference = make_generator("none")
+    generator = make_generator(checkpointing)
+    assert generator.state_dict().keys() == reference.state_dict().keys()
+
+    x = torch.rand(2, 3, 32, 32) * 2 - 1
+    expected = reference(x)
+    out = generator(x)
+    torch.testing.assert_close(out, expected)
+
+    expected.square().mean().backward()
+    out.square().mean().backward()
+    for p, p_ref in zip(generator.parameters(), reference.parameters()):
+        torch.testing.assert_close(p.grad, p_ref.grad)
+
+
+def test_unknown_checkpointing_mode():
+    with pytest.raises(ValueError):
+        make_generator("everything")
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from mlops.src.data.manifest import PairManifest
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+def test_manifest_resolves_pairs_and_skips_missing_targets(pair_dir, tmp_path):
+    os.remove(pair_dir / "images" / "0003.jpg")
+    manifest_path = str(tmp_path / "manifest.json")
+
+    dataset = Pix2PixHDDataset(
+        str(pair_dir), "sketches/", "images/", img_size=32, manifest_path=manifest_path
+    )
+    assert len(dataset) == 5
+    assert dataset.targets is not None
+    assert all(os.path.exists(t) for t in dataset.targets)
+
+    with open(manifest_path) as f:
+        entry = json.load(f)["pairs"][0]
+    assert entry["sketch_size"] == [48, 40]
+    assert entry["photo"] == os.path.join("images", "0000.jpg")
+
+
+def test_manifest_refresh_adds_new_pairs_incrementally(pair_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    target_path = Pix2PixHDDataset(str(pair_dir), "sketches/", "images/").target_path
+    first = PairManifest.load_or_build(
+        manifest_path, str(pair_dir), "sketches/", "images/", target_path
+    )
+
+    shutil.copy(pair_dir / "sketches" / "0000.jpg", pair_dir / "sketches" / "0100.jpg")
+    shutil.copy(pair_dir / "images" / "0000.jpg", pair_dir / "images" / "0100.jpg")
+    cached = PairManifest.load_or_build(
+        manifest_path, str(pair_dir), "sketches/", "images/", target_path
+    )
+    refreshed = PairManifest.load_or_build(
+        manifest_path, str(pair_dir), "sketches/", "images/", target_path, refresh=True
+    )
+
+    assert len(first) == len(cached) == 6
+    assert len(refreshed) == 7
+    assert refreshed.entries[0] == first.entries[0]
+
+
+def test_manifest_drops_pairs_deleted_after_it_was_built(pair_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    args = (str(pair_dir), "sketches/", "images/", 16)
+    assert len(Pix2PixHDDataset(*args, manifest_path=manifest_path)) == 6
+
+    for folder in ("sketches", "images"):
+        os.remove(pair_dir / folder / "0003.jpg")
+    dataset = Pix2PixHDDataset(*args, manifest_path=manifest_path)
+
+    assert len(dataset) == 5
+    for idx in range(len(dataset)):
+        dataset[idx]
+    with open(manifest_path) as f:
+        assert json.load(f)["count"] == 5
+
+
+def test_manifest_load_rejects_other_folders(pair_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    target_path = Pix2PixHDDataset(str(pair_dir), "sketches/", "images/").target_path
+    PairManifest.build(str(pair_dir), "sketches/", "images/", target_path).save(manifest_path)
+
+    with pytest.raises(ValueError):
+        PairManifest.load(manifest_path, str(pair_dir), "sketches/", "photos/")
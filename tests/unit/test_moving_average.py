@@ -0,0 +1,57 @@
+import copy
+
+import torch
+from torch import nn
+
+from mlops.src.components.moving_average import ModelEMA
+
+
+def make_models():
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Conv2d(3, 4, 3), nn.BatchNorm2d(4))
+    ema_model = copy.deepcopy(model)
+    return model, ema_model
+
+
+def perturb(model):
+    with torch.no_grad():
+        for p in model.parameters():
+            p.add_(torch.randn_like(p))
+        model[1].running_mean.add_(1.0)
+
+
+def test_update_matches_reference_formula():
+    model, ema_model = make_models()
+    ema = ModelEMA(model, ema_model, decay=0.9)
+    before = [p.clone() for p in ema_model.parameters()]
+    perturb(model)
+
+    assert ema.step()
+    for p_ema, p_old, p in zip(ema_model.parameters(), before, model.parameters()):
+        torch.testing.assert_close(p_ema, 0.9 * p_old + 0.1 * p)
+    torch.testing.assert_close(ema_model[1].running_mean, model[1].running_mean)
+
+
+def test_update_interval_compounds_decay():
+    model, ema_model = make_models()
+    ema = ModelEMA(model, ema_model, decay=0.9, update_every=3)
+    before = [p.clone() for p in ema_model.parameters()]
+    perturb(model)
+
+    assert not ema.step()
+    assert not ema.step()
+    assert ema.step()
+    for p_ema, p_old, p in zip(ema_model.parameters(), before, model.parameters()):
+        torch.testing.assert_close(p_ema, 0.9**3 * p_old + (1 - 0.9**3) * p)
+
+
+def test_warmup_copies_weights():
+    model, ema_model = make_models()
+    ema = ModelEMA(model, ema_model, decay=0.9, update_every=4, warmup_steps=2)
+    for _ in range(2):
+        perturb(model)
+        assert ema.step()
+        for p_ema, p in zip(ema_model.parameters(), model.parameters()):
+            torch.testing.assert_close(p_ema, p)
+            assert p_ema.data_ptr() != p.data_ptr()
+    assert ema.current_decay() == 0.9**4
@@ -0,0 +1,294 @@
+import os
+import random
+
+import pytest
+import torch
+
+from mlops.src.components.compilation import compile_modules
+from mlops.src.components.discriminator import define_D
+from mlops.src.components.generator import define_G
+from mlops.src.components.losses import GANLoss
+from mlops.src.components.replay_pool import ReplayPool
+from mlops.src.data.sampler import ResumableSampler
+from mlops.src.models.pix2pixhd_module import Pix2PixHD
+
+
+def make_model(tmp_path, **kwargs):
+    torch.manual_seed(0)
+    generator = define_G(3, 3, 8, "global", n_downsample_global=2, n_blocks_global=2)
+    discriminator = define_D(6, 8, 2, num_D=2, getIntermFeat=True)
+    return Pix2PixHD(
+        generator=generator,
+        discriminator=discriminator,
+        criterion_gan=GANLoss(use_lsgan=True),
+        criterion_feat=torch.nn.L1Loss(),
+        criterion_vgg=torch.nn.L1Loss(),
+        replay_pool=ReplayPool(0),
+        device=torch.device("cpu"),
+        checkpoint_dir=str(tmp_path),
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def batch():
+    torch.manual_seed(1)
+    return torch.rand(2, 3, 32, 32) * 2 - 1, torch.rand(2, 3, 32, 32) * 2 - 1
+
+
+def test_reused_fake_matches_fresh_generator_pass(tmp_path, batch):
+    model = make_model(tmp_path)
+    data, target = batch
+
+    g_losses, fake = model.calc_G_losses(data, target, return_fake=True)
+    assert not fake.requires_grad
+    reused = model.calc_D_losses(data, target, fake=fake)
+    fresh = model.calc_D_losses(data, target)
+
+    assert g_losses.keys() == model.calc_G_losses(data, target).keys()
+    for k in fresh:
+        torch.testing.assert_close(reused[k], fresh[k])
+
+
+def test_reused_fake_approximates_fresh_fake_in_training(tmp_path):
+    images = torch.rand(8, 3, 32, 32) * 2 - 1
+    loader = torch.utils.data.DataLoader(
+        torch.utils.data.TensorDataset(images, images.flip(-1)), batch_size=2
+    )
+    logs = []
+    for reuse_fake in (False, True):
+        model = make_model(tmp_path / str(reuse_fake), reuse_fake=reuse_fake)
+        g_optimizer, d_optimizer = model.configure_optimizers()
+        model.train_epoch(loader, loader, 0, g_optimizer, d_optimizer)
+        model.close()
+        logs.append(model.loss_log)
+
+    # Not exact: the reused fake comes from the weights before each generator update
+    fresh, reused = logs
+    assert reused["D_false"] != fresh["D_false"]
+    for k in fresh:
+        assert reused[k] == pytest.approx(fresh[k], rel=0.02), k
+
+
+def test_fused_discriminator_matches_separate_calls(tmp_path, batch):
+    model = make_model(tmp_path)
+    fused = make_model(tmp_path, fuse_discriminator=True)
+    data, target = batch
+
+    g_losses, fake = model.calc_G_losses(data, target, return_fake=True)
+    fused_g_losses = fused.calc_G_losses(data, target)
+    d_losses = model.calc_D_losses(data, target, fake=fake)
+    fused_d_losses = fused.calc_D_losses(data, target, fake=fake)
+
+    for k in g_losses:
+        torch.testing.assert_close(fused_g_losses[k], g_losses[k])
+    for k in d_losses:
+        torch.testing.assert_close(fused_d_losses[k], d_losses[k])
+
+    fused_g_losses["G_adv"].backward()
+    g_losses["G_adv"].backward()
+    for p_fused, p in zip(fused.generator.parameters(), model.generator.parameters()):
+        torch.testing.assert_close(p_fused.grad, p.grad)
+
+
+def test_loss_sums_stay_on_device_until_sync(tmp_path, batch):
+    model = make_model(tmp_path)
+    data, target = batch
+
+    expected: dict[str, float] = {}
+    for _ in range(3):
+        losses = model.calc_D_losses(data, target)
+        model.process_loss(losses)
+        for k, v in losses.items():
+            expected[k] = expected.get(k, 0.0) + v.item()
+
+    assert model.loss_log == {}
+    log = model.sync_loss_log()
+    assert log.keys() == expected.keys()
+    for k in expected:
+        assert log[k] == pytest.approx(expected[k], rel=1e-6)
+
+
+def loss_curve(tmp_path, precision, epochs=3):
+    model = make_model(tmp_path / precision, precision=precision)
+    g_optimizer, d_optimizer = model.configure_optimizers()
+    torch.manual_seed(2)
+    images = torch.rand(8, 3, 32, 32) * 2 - 1
+    dataset = torch.utils.data.TensorDataset(images, images.flip(-1))
+    loader = torch.utils.data.DataLoader(dataset, batch_size=2)
+
+    curve = []
+    for epoch in range(epochs):
+        model.train_epoch(loader, loader, epoch, g_optimizer, d_optimizer)
+        curve.append({k: v / model.epoch_steps for k, v in model.loss_log.items()})
+    return curve
+
+
+@pytest.mark.parametrize("precision", ["bf16", "16"])
+def test_mixed_precision_tracks_fp32_loss_curve(tmp_path, precision):
+    reference = loss_curve(tmp_path, "32")
+    curve = loss_curve(tmp_path, precision)
+
+    for expected, actual in zip(reference, curve):
+        assert actual.keys() == expected.keys()
+        for k in expected:
+            assert actual[k] == pytest.approx(expected[k], rel=0.1), k
+
+
+def test_gradient_accumulation_matches_full_batch(tmp_path):
+    torch.manual_seed(3)
+    images = torch.rand(4, 3, 32, 32) * 2 - 1
+    dataset = torch.utils.data.TensorDataset(images, images.flip(-1))
+
+    trained = []
+    for batch_size, accumulate in [(4, 1), (2, 2)]:
+        model = make_model(
+            tmp_path / str(accumulate), reuse_fake=True, accumulate_grad_batches=accumulate
+        )
+        g_optimizer = torch.optim.SGD(model.generator.parameters(), lr=0.1)
+        d_optimizer = torch.optim.SGD(model.discriminator.parameters(), lr=0.1)
+        loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size)
+        model.train_epoch(loader, loader, 0, g_optimizer, d_optimizer)
+        assert model.ema.steps == 1
+        trained.append(model)
+
+    full, accumulated = trained
+    for p_acc, p in zip(accumulated.generator.parameters(), full.generator.parameters()):
+        torch.testing.assert_close(p_acc, p, rtol=1e-4, atol=1e-6)
+    for p_acc, p in zip(accumulated.discriminator.parameters(), full.discriminator.parameters()):
+        torch.testing.assert_close(p_acc, p, rtol=1e-4, atol=1e-6)
+
+
+def test_checkpoints_wait_for_the_optimizer_step(tmp_path):
+    model = make_model(tmp_path, accumulate_grad_batches=2)
+    g_optimizer, d_optimizer = model.configure_optimizers()
+    images = torch.rand(8, 3, 32, 32) * 2 - 1
+    loader = torch.utils.data.DataLoader(
+        torch.utils.data.TensorDataset(images, images), batch_size=2
+    )
+    saved = []
+    model.save_checkpoint = lambda epoch, step=0, last_only=False: saved.append(step)
+
+    model.train_epoch(loader, loader, 0, g_optimizer, d_optimizer)
+    model.close()
+    # The end-of-epoch trigger also fires at batch 3, inside the second window
+    assert saved == [4]
+
+
+def test_warmup_leaves_state_untouched(tmp_path, batch):
+    model = make_model(tmp_path, reuse_fake=True)
+    model.replay_pool = ReplayPool(4)
+    before = {k: v.clone() for k, v in model.generator.state_dict().items()}
+
+    model.warmup(*batch, steps=2)
+
+    assert model.replay_pool.data == []
+    assert all(p.grad is None for p in model.generator.parameters())
+    assert all(p.grad is None for p in model.discriminator.parameters())
+    for k, v in model.generator.state_dict().items():
+        torch.testing.assert_close(v, before[k])
+
+
+def test_compiled_modules_keep_parameter_names(tmp_path, batch):
+    model = make_model(tmp_path)
+    keys = model.generator.state_dict().keys(), model.discriminator.state_dict().keys()
+    expected = model.calc_D_losses(*batch)
+
+    compile_modules(model.generator, model.discriminator, backend="eager")
+    compiled = model.calc_D_losses(*batch)
+
+    assert (model.generator.state_dict().keys(), model.discriminator.state_dict().keys()) == keys
+    for k in expected:
+        torch.testing.assert_close(compiled[k], expected[k])
+
+
+def resumable_run(tmp_path, stop_after=None, resume_from=None):
+    model = make_model(tmp_path, reuse_fake=True, checkpoint_replay_pool="full")
+    model.replay_pool = ReplayPool(4)
+    g_optimizer, d_optimizer = model.configure_optimizers()
+    torch.manual_seed(4)
+    images = torch.rand(10, 3, 32, 32) * 2 - 1
+    dataset = torch.utils.data.TensorDataset(images, images.flip(-1))
+    sampler = ResumableSampler(dataset)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=2, sampler=sampler)
+    test_loader = torch.utils.data.DataLoader(dataset, batch_size=2)
+
+    random.seed(0)
+    if resume_from is not None:
+        # Scramble the generators; the checkpoint must restore them
+        torch.manual_seed(123)
+        random.seed(123)
+        sampler.load_state_dict(model.load_checkpoint(resume_from, g_optimizer, d_optimizer))
+    if stop_after is not None:
+        update_ema = model.update_ema
+
+        def update_and_stop():
+            if model.ema.steps == stop_after - 1:
+                model.request_stop()
+            return update_ema()
+
+        model.update_ema = update_and_stop
+
+    model.train_epoch(loader, test_loader, 0, g_optimizer, d_optimizer)
+    model.close()
+    return model, g_optimizer
+
+
+def test_resume_continues_from_the_exact_step(tmp_path):
+    interrupted, _ = resumable_run(tmp_path / "a", stop_after=2)
+    assert interrupted.preempted and interrupted.total_steps == 2
+    assert [p.name for p in (tmp_path / "a").glob("*.pt")] == ["last.pt"]
+
+    resumed, optimizer = resumable_run(tmp_path / "b", resume_from=str(tmp_path / "a" / "last.pt"))
+    reference, reference_optimizer = resumable_run(tmp_path / "c")
+
+    assert resumed.total_steps == reference.total_steps == 5
+    # Batch numbering continues the interrupted epoch, loss means cover the new batches
+    assert resumed.epoch_steps == 3
+    checkpoints = sorted(p.name for p in (tmp_path / "b").glob("epoch_*.pt"))
+    assert checkpoints == sorted(p.name for p in (tmp_path / "c").glob("epoch_*.pt"))
+    for name in ("generator", "generator_ema", "discriminator"):
+        expected = getattr(reference, name).state_dict()
+        for k, v in getattr(resumed, name).state_dict().items():
+            torch.testing.assert_close(v, expected[k])
+    expected_moments = reference_optimizer.state_dict()["state"]
+    for k, v in optimizer.state_dict()["state"].items():
+        torch.testing.assert_close(v["exp_avg_sq"], expected_moments[k]["exp_avg_sq"])
+    assert len(resumed.replay_pool.data) == len(reference.replay_pool.data) == 4
+    for rec, expected_rec in zip(resumed.replay_pool.data, reference.replay_pool.data):
+        for k in expected_rec:
+            torch.testing.assert_close(rec[k], expected_rec[k])
+
+
+def test_replay_pool_checkpoint_modes(tmp_path, batch):
+    sizes = {}
+    for mode in ("full", "uint8", "none"):
+        model = make_model(tmp_path / mode, checkpoint_replay_pool=mode)
+        model.replay_pool = ReplayPool(4)
+        model.calc_D_losses(*batch)
+        model.save_checkpoint(0, 1)
+        model.close()
+
+        restored = make_model(tmp_path / mode)
+        restored.replay_pool = ReplayPool(4)
+        restored.load_checkpoint(str(tmp_path / mode / "last.pt"))
+        assert len(restored.replay_pool.data) == (0 if mode == "none" else 2)
+        sizes[mode] = os.path.getsize(tmp_path / mode / "last.pt")
+
+    assert sizes["none"] < sizes["uint8"] < sizes["full"]
+
+
+def test_loads_weights_only_checkpoints(tmp_path):
+    source = make_model(tmp_path)
+    for p in source.generator_ema.parameters():
+        p.data.add_(1)
+    torch.save(
+        {"G": source.generator_ema.state_dict(), "D": source.discriminator.state_dict()},
+        tmp_path / "old.pt",
+    )
+
+    model = make_model(tmp_path)
+    assert model.load_checkpoint(str(tmp_path / "old.pt")) is None
+    for k, v in source.generator_ema.state_dict().items():
+        torch.testing.assert_close(model.generator.state_dict()[k], v)
+        torch.testing.assert_close(model.generator_ema.state_dict()[k], v)
@@ -0,0 +1,48 @@
+import threading
+
+import cv2
+import numpy as np
+import torch
+
+from mlops.src.components.preview import PreviewWriter, make_preview_grid
+
+
+def test_grid_matches_per_sample_layout():
+    torch.manual_seed(0)
+    data, fake, target = (torch.rand(3, 3, 8, 10) * 2 - 1 for _ in range(3))
+
+    pairs = torch.cat([data, fake, target], -1)
+    rows = []
+    for idx in range(pairs.shape[0]):
+        img = 255 * (pairs[idx] + 1) / 2
+        rows.append(img.permute(1, 2, 0).clip(0, 255).numpy().astype(np.uint8))
+    expected = cv2.cvtColor(np.vstack(rows), cv2.COLOR_RGB2BGR)
+
+    grid = make_preview_grid(data, fake, target).numpy()
+    assert grid.shape == (24, 30, 3)
+    # Rounding of the scaled value may differ by one level
+    assert np.abs(grid.astype(int) - expected.astype(int)).max() <= 1
+
+
+def test_writer_writes_queued_images(tmp_path):
+    writer = PreviewWriter(str(tmp_path))
+    image = torch.randint(0, 256, (16, 48, 3), dtype=torch.uint8)
+    for i in range(3):
+        assert writer.submit(image, f"{i}.png")
+    writer.close()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["0.png", "1.png", "2.png"]
+    np.testing.assert_array_equal(cv2.imread(str(tmp_path / "0.png")), image.numpy())
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(cv2, "imwrite", lambda *args: release.wait())
+    writer = PreviewWriter(str(tmp_path), max_queue=1)
+    image = torch.zeros(4, 4, 3, dtype=torch.uint8)
+
+    results = [writer.submit(image, f"{i}.jpg") for i in range(5)]
+    assert not all(results)
+    assert writer.dropped == results.count(False)
+    release.set()
+    writer.close()
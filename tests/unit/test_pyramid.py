@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import cv2
+import pytest
+
+from mlops.data_processing import preprocess
+from mlops.src.data.file_ledger import FileLedger
+from mlops.src.data.pyramid import level_dir, select_level
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+def make_levels(root, sizes):
+    for size in sizes:
+        level_dir(str(root), size).mkdir(parents=True)
+
+
+def test_exact_level_is_preferred(tmp_path):
+    make_levels(tmp_path, [128, 256, 512])
+    assert select_level(str(tmp_path), 256) == tmp_path / "256"
+
+
+def test_smallest_larger_level_is_used(tmp_path):
+    make_levels(tmp_path, [128, 512, 1024])
+    (tmp_path / "notes").mkdir()
+    assert select_level(str(tmp_path), 256) == tmp_path / "512"
+
+
+def test_no_level_large_enough(tmp_path):
+    make_levels(tmp_path, [64, 128])
+    assert select_level(str(tmp_path), 256) is None
+    assert select_level(str(tmp_path / "missing"), 64) is None
+
+
+def test_dataset_reads_from_the_matching_level(pair_dir, tmp_path):
+    pyramid = tmp_path / "pyramid"
+    preprocess(
+        pair_dir,
+        tmp_path / "processed" / "sketches",
+        tmp_path / "processed" / "images",
+        None,
+        FileLedger(str(tmp_path / "ledger.json")),
+        pyramid_dir=str(pyramid),
+        pyramid_sizes=[16, 32],
+    )
+    for level in (16, 32):
+        out = cv2.imread(str(pyramid / str(level) / "images" / "0000.jpg"))
+        assert out is not None and out.shape == (level, level, 3)
+
+    dataset = Pix2PixHDDataset(str(pair_dir), "sketches/", "images/", 24, pyramid_dir=str(pyramid))
+    assert Path(dataset.imagesDir) == pyramid / "32"
+    assert len(dataset) == 6
+    assert dataset.load_pair(0)[0].shape == (24, 24, 3)
+
+    dataset = Pix2PixHDDataset(str(pair_dir), "sketches/", "images/", 64, pyramid_dir=str(pyramid))
+    assert dataset.imagesDir == str(pair_dir)
+
+
+def test_pyramid_sizes_require_a_directory(pair_dir, tmp_path):
+    with pytest.raises(ValueError):
+        preprocess(
+            pair_dir,
+            tmp_path / "sketches",
+            tmp_path / "images",
+            None,
+            FileLedger(str(tmp_path / "ledger.json")),
+            pyramid_sizes=[16],
+        )
@@ -0,0 +1,46 @@
+import torch
+
+from mlops.src.components.replay_pool import ReplayPool
+
+
+def batch(value, n=4):
+    return {"input": torch.full((n, 1), float(value)), "output": torch.full((n, 1), float(value))}
+
+
+def test_read_only_query_leaves_pool_unchanged():
+    pool = ReplayPool(4)
+    pool.add(batch(1))
+    stored = [rec["input"].clone() for rec in pool.data]
+
+    for _ in range(5):
+        out = pool.query(batch(2), update=False)
+        assert set(out["input"].flatten().tolist()) <= {1.0, 2.0}
+    assert [rec["input"] for rec in pool.data] == stored
+
+
+def test_add_fills_then_replaces():
+    pool = ReplayPool(4)
+    pool.add(batch(1, n=3))
+    assert len(pool.data) == 3
+    pool.add(batch(2, n=16))
+    assert len(pool.data) == 4
+    assert any(rec["input"].item() == 2.0 for rec in pool.data)
+
+
+def test_quantized_state_round_trips_within_one_level(tmp_path):
+    torch.manual_seed(0)
+    pool = ReplayPool(8)
+    pool.add({"input": torch.rand(6, 3, 4, 4) * 2 - 1, "output": torch.rand(6, 3, 4, 4) * 2 - 1})
+
+    torch.save(pool.state_dict(quantize=True), tmp_path / "pool.pt")
+    state = torch.load(tmp_path / "pool.pt")
+    assert state["data"]["output"].dtype == torch.uint8
+    assert state["data"]["output"].shape == (6, 3, 4, 4)
+
+    restored = ReplayPool(8)
+    restored.load_state_dict(state)
+    assert len(restored.data) == 6
+    for rec, expected in zip(restored.data, pool.data):
+        for k in expected:
+            assert rec[k].dtype == expected[k].dtype
+            torch.testing.assert_close(rec[k], expected[k], rtol=0, atol=1 / 255)
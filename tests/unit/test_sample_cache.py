@@ -0,0 +1,37 @@
+import numpy as np
+import torch
+
+from mlops.src.data.sample_cache import SharedSampleCache
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+def _pair(value):
+    return np.full((4, 4, 3), value, np.uint8), np.full((4, 4, 3), value + 1, np.uint8)
+
+
+def test_cache_evicts_unreferenced_slots_first():
+    cache = SharedSampleCache(num_samples=10, img_size=4, max_bytes=2 * 2 * 4 * 4 * 3)
+    assert cache.num_slots == 2
+
+    cache.put(0, *_pair(0))
+    cache.put(1, *_pair(10))
+    hit = cache.get(0)
+    assert hit is not None and hit[1][0, 0, 0] == 1  # sample 0 is now referenced
+
+    cache.put(2, *_pair(20))
+    assert cache.get(1) is None
+    assert cache.get(0) is not None
+    hit = cache.get(2)
+    assert hit is not None and hit[0][0, 0, 0] == 20
+
+
+def test_cache_is_filled_by_dataloader_workers(pair_dir):
+    dataset = Pix2PixHDDataset(
+        str(pair_dir), "sketches/", "images/", img_size=8, batch_augment=True, cache_bytes=1 << 20
+    )
+    loader = torch.utils.data.DataLoader(dataset, batch_size=2, num_workers=2)
+    first = torch.cat([src for src, _ in loader])
+
+    assert dataset.cache is not None
+    assert len(dataset.cache) == len(dataset)
+    torch.testing.assert_close(torch.cat([src for src, _ in loader]), first)
@@ -0,0 +1,54 @@
+from typing import cast
+
+from torch.utils.data import DataLoader, Dataset
+
+from mlops.src.data.sampler import ResumableSampler
+
+
+def _loader(dataset: list[int], sampler: ResumableSampler) -> DataLoader:
+    return DataLoader(cast(Dataset, dataset), batch_size=4, sampler=sampler)
+
+
+def test_sampler_order_is_seeded_per_epoch():
+    sampler = ResumableSampler(range(20), seed=3)
+    first = list(sampler)
+    assert sorted(first) == list(range(20))
+    assert list(ResumableSampler(range(20), seed=3)) == first
+
+    sampler.set_epoch(1)
+    assert list(sampler) != first
+
+
+def test_sampler_resumes_at_first_unseen_batch():
+    dataset = list(range(20))
+    sampler = ResumableSampler(dataset, seed=0)
+    sampler.set_epoch(2)
+    loader = _loader(dataset, sampler)
+    full = [b.tolist() for b in loader]
+
+    for _ in range(2):
+        sampler.advance(4)
+    state = sampler.state_dict()
+
+    resumed = ResumableSampler(dataset)
+    resumed.load_state_dict(state)
+    resumed.set_epoch(2)
+    loader = _loader(dataset, resumed)
+    assert len(loader) == 3
+    assert [b.tolist() for b in loader] == full[2:]
+
+
+def test_ranks_partition_the_epoch():
+    shards = [ResumableSampler(range(10), seed=1, num_replicas=3, rank=r) for r in range(3)]
+    for sampler in shards:
+        sampler.set_epoch(4)
+    orders = [list(sampler) for sampler in shards]
+
+    assert [len(order) for order in orders] == [4, 4, 4]
+    assert set(sum(orders, [])) == set(range(10))
+
+    # Resuming on a single process keeps the number of consumed samples
+    shards[0].advance(2)
+    single = ResumableSampler(range(10), seed=1)
+    single.load_state_dict(shards[0].state_dict())
+    assert single.offset == 6
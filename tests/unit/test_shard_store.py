@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from mlops.src.data.shard_store import ShardStore, write_shards
+from mlops.src.models.pix2pixhd_module import Pix2PixHDDataset
+
+
+def test_shard_store_matches_decoded_pairs(pair_dir, tmp_path):
+    dataset = Pix2PixHDDataset(str(pair_dir), "sketches/", "images/", img_size=32)
+    pairs = [dataset.load_pair(i) for i in range(len(dataset))]
+    write_shards(str(tmp_path / "shards"), dataset.images, iter(pairs), 32)
+
+    packed = Pix2PixHDDataset(
+        str(pair_dir), "sketches/", "images/", img_size=32, shard_dir=str(tmp_path / "shards")
+    )
+    assert len(packed) == len(dataset)
+    for idx, (src, dst) in enumerate(pairs):
+        p_src, p_dst = packed.load_pair(idx)
+        np.testing.assert_array_equal(p_src, src)
+        np.testing.assert_array_equal(p_dst, dst)
+
+    src_tensor, dst_tensor = packed[0]
+    assert src_tensor.shape == dst_tensor.shape == (3, 32, 32)
+
+
+def test_shard_store_rejects_size_mismatch(pair_dir, tmp_path):
+    dataset = Pix2PixHDDataset(str(pair_dir), "sketches/", "images/", img_size=16)
+    pairs = (dataset.load_pair(i) for i in range(len(dataset)))
+    write_shards(str(tmp_path / "shards"), dataset.images, pairs, 16)
+
+    assert len(ShardStore(str(tmp_path / "shards"))) == len(dataset)
+    with pytest.raises(ValueError):
+        Pix2PixHDDataset(
+            str(pair_dir), "sketches/", "images/", img_size=32, shard_dir=str(tmp_path / "shards")
+        )